@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Non-blocking logging pipeline
+| Remember:
+| - QueueHandler puts log records in a bounded queue; it never writes a file.
+|   QueueListener is a thread that takes the records from the queue and
+|   passes them to the real handlers (FileHandler, ...), routed by logger name.
+| - Policy if the queue is full:
+|   'drop':  the record is dropped at once (the caller never waits)
+|   'block': the caller waits at most <timeout> seconds (backpressure),
+|            then the record is dropped
+|   Dropped records are counted per handler.
+| - The message of a record is made complete (args merged) in the thread of
+|   the caller; formatting (time, level, ...) is done by the listener.
+| - Python 2.7 has no logging.handlers.QueueHandler; this is a small
+|   version of it with a bounded queue and counters.
+| Usage:
+|    queue = Queue.Queue(1000)
+|    listener = QueueListener(queue, {'DXP': [fileHandler]})
+|    logging.getLogger('DXP').addHandler(QueueHandler(queue))
+|    ...
+|    listener.stop()
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import logging, threading, Queue
+
+POLICIES = ('drop', 'block')
+
+class QueueHandler(logging.Handler):
+   # Handler that puts records in a bounded queue (see module doc for the policies)
+
+   def __init__(self, queue, policy='drop', timeout=0.1):
+      logging.Handler.__init__(self)
+      if policy not in POLICIES: raise Exception("unknown log queue policy: %s" % policy)
+      self.queue = queue
+      self.policy = policy
+      self.timeout = timeout
+      self.queued = 0     # records put in the queue
+      self.dropped = 0    # records dropped: queue full
+
+   def prepare(self, record):
+      # Merge message and args now: args can change before the listener formats the record
+      record.msg = record.getMessage()
+      record.args = None
+      if record.exc_info:
+         record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
+         record.exc_info = None
+      return record
+
+   def emit(self, record):
+      try:
+         record = self.prepare(record)
+         if self.policy == 'drop':
+            self.queue.put_nowait(record)
+         else:
+            self.queue.put(record, True, self.timeout)
+         self.queued += 1
+      except Queue.Full:
+         self.dropped += 1
+      except:
+         self.handleError(record)
+      return None
+
+   def stats(self):
+      return "queued %d  dropped %d  waiting %d  policy %s" % \
+             (self.queued, self.dropped, self.queue.qsize(), self.policy)
+
+# *** END class QueueHandler ***
+
+
+class QueueListener(threading.Thread):
+   # Thread passing the records of the queue to the handlers of routes:
+   # a dict {logger name: list of handlers}. The level of each handler is respected.
+   #
+
+   _STOP = None    # sentinel
+
+   def __init__(self, queue, routes):
+      threading.Thread.__init__(self)
+      self.daemon = True
+      self.queue = queue
+      self.routes = routes
+      self.handled = 0
+      self.start()
+
+   def run(self):
+      while True:
+         record = self.queue.get()
+         if record is self._STOP: break
+         for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+               handler.handle(record)
+         self.handled += 1
+      return None
+
+   def stop(self):
+      # Handle the records still in the queue, then stop the thread
+      if self.is_alive():
+         self.queue.put(self._STOP)    # blocking: the sentinel must not be dropped
+         self.join()
+      for handlers in self.routes.values():
+         for handler in handlers: handler.flush()
+      return None
+
+# *** END class QueueListener ***
+
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Batch check of positions in FEN notation
+| Reads a file with one FEN per line and writes one JSON line per position:
+| - line:     line number in the input file
+| - fen:      the FEN string
+| - side:     color to move (W or B)
+| - moves:    legal moves in user format (like 32-28 or 26x37)
+| - captures: number of pieces taken by each legal move (0: no capture)
+| - error:    parse or legality error (moves and captures are missing then)
+| EPD operations after the FEN (separated by ';') are copied to field epd.
+| The file is processed line by line, so its size is not limited by memory.
+| Usage:
+| - python dxc100_batch.py <file> [--output file] [--processes N] [--backend name]
+| - python dxc100_batch.py -   (read from standard input)
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, json
+import argparse
+import dxc100_config as C
+import dxc100_moves
+from dxc100_moves import gen_moves
+from dxc100_position import parseFEN
+from dxc100_classes import Moving
+from dxc100_parallel import numProcesses, imapBatches
+
+moving = Moving()
+
+def checkPosition(pos):     # PUBLIC
+   # Returns error text if the position cannot occur in a game, else None
+   setup = pos.msetup(pos.color)
+   if setup.count('P') + setup.count('K') > 20: return "more than 20 white pieces"
+   if setup.count('p') + setup.count('k') > 20: return "more than 20 black pieces"
+   for i in range(1, 6):
+      if setup[i] == 'P': return "white piece on promotion square %d" % i
+   for i in range(46, 51):
+      if setup[i] == 'p': return "black piece on promotion square %d" % i
+   return None
+# end checkPosition
+
+
+def analyseLine(item):     # PUBLIC
+   # Parameter item is (line number, text of line). Returns dict of results.
+   lineNum, text = item
+   fen, _, epd = text.strip().partition(';')
+   fen = fen.strip()
+   result = {'line': lineNum, 'fen': fen}
+   if epd.strip(): result['epd'] = epd.strip()
+   try:
+      pos = parseFEN(fen, colorAware=True)
+   except:
+      result['error'] = "invalid FEN: %s" % sys.exc_info()[1]
+      return result
+   result['side'] = 'W' if pos.color == C.WHITE else 'B'
+   error = checkPosition(pos)
+   if error is not None:
+      result['error'] = error
+      return result
+   moves = gen_moves(pos)
+   result['moves'] = [ moving.render_move(move) for move in moves ]
+   result['captures'] = len(moves[0].takes) if moves else 0
+   return result
+# end analyseLine
+
+
+def readLines(infile):
+   # Generator of (line number, text) of lines with a FEN; skips empty and comment (#) lines
+   for lineNum, text in enumerate(infile, 1):
+      text = text.strip()
+      if text == '' or text.startswith('#'): continue
+      yield lineNum, text
+
+
+def runBatch(infile, out=sys.stdout, processes=1):     # PUBLIC
+   # Analyse all FEN lines of infile and write JSON lines to out.
+   # Returns (number of positions, number of errors)
+   count = errors = 0
+   for result in imapBatches(analyseLine, readLines(infile), processes):
+      out.write(json.dumps(result, sort_keys=True) + "\n")
+      count += 1
+      if 'error' in result: errors += 1
+   out.flush()
+   return count, errors
+# end runBatch
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Batch check of FEN positions of the DXC100 client')
+   parser.add_argument('file', help='file with one FEN per line (- for standard input)')
+   parser.add_argument('--output', help='file for the JSON lines (default standard output)')
+   parser.add_argument('--processes', type=int, default=1, metavar='N',
+                       help='check positions with N processes (0: all cores)')
+   parser.add_argument('--backend', choices=dxc100_moves.BACKENDS, help='move generator')
+   args = parser.parse_args()
+
+   if args.backend: dxc100_moves.set_backend(args.backend)
+   infile = sys.stdin if args.file == '-' else open(args.file)
+   out = sys.stdout if args.output is None else open(args.output, 'w')
+   processes = 1 if args.processes == 1 else numProcesses(args.processes)
+   try:
+      count, errors = runBatch(infile, out, processes)
+   finally:
+      if infile is not sys.stdin: infile.close()
+      if out is not sys.stdout: out.close()
+   sys.stderr.write("%d positions, %d errors\n" % (count, errors))
+   return 0 if errors == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Bitboard move generator for Draughts 100 International Rules
+| Remember:
+| - A position is stored as four 50-bit integers: own men, own kings,
+|   opponent men and opponent kings. Square n (1..50) is bit n-1.
+| - Own pieces are the pieces of the player to move: white (uppercase letters)
+|   for "one-color" positions, black (lowercase) for colour-aware positions.
+| - Output is the same list of Move(steps, takes) as dxc100_moves.gen_moves.
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import dxc100_config as C
+from dxc100_moves import Move, NE, NW, SE, SW, directions, OWN, KING
+
+BIT = [0] + [1 << (i-1) for i in range(1, 51)] + [0]   # square -> bit; squares 0 and 51 unused
+ALL = (1 << 50) - 1                                    # mask of all 50 squares
+
+def _shifts(d):
+   # Table of (delta, mask) for direction d: squares in mask move delta squares in direction d.
+   # Delta depends on the row of the square, so a direction has two or three deltas.
+   table = {}
+   for i in range(1, 51):
+      if d[i] == 0: continue
+      delta = d[i] - i
+      table[delta] = table.get(delta, 0) | BIT[i]
+   return tuple(sorted(table.items()))
+
+def _rays(d):
+   # Table of ray tuples for direction d: all squares from i in direction d
+   rays = [()]
+   for i in range(1, 51):
+      ray = []
+      j = d[i]
+      while j != 0:
+         ray.append(j)
+         j = d[j]
+      rays.append(tuple(ray))
+   return tuple(rays + [()])
+
+def _jumps(d):
+   # Table of (over, land) for direction d: man on i captures over and lands on land
+   jumps = [None]
+   for i in range(1, 51):
+      jumps.append( (d[i], d[d[i]]) if d[i] != 0 and d[d[i]] != 0 else None )
+   return tuple(jumps + [None])
+
+SHIFTS = [ _shifts(d) for d in directions ]     # same order as directions: NE, SE, SW, NW
+RAYS   = [ _rays(d) for d in directions ]
+JUMPS  = [ _jumps(d) for d in directions ]
+
+# Men move forward (NE and NW for white, SE and SW for black); men capture in all directions
+FORWARD_SHIFTS = ( (_shifts(NE), _shifts(NW)), (_shifts(SE), _shifts(SW)) )   # index is color
+
+def shift(mask, d_shifts):
+   # Move all squares of mask one step in a direction given by its shift table
+   result = 0
+   for delta, dmask in d_shifts:
+      if delta > 0: result |= (mask & dmask) << delta
+      else:         result |= (mask & dmask) >> -delta
+   return result
+
+
+def fromSetup(setup, color=C.WHITE):     # PUBLIC
+   # Convert a setup (list or string of 52 char) to (men, kings, omen, okings)
+   # Own pieces are the pieces of color; white for a "one-color" setup.
+   men = kings = omen = okings = 0
+   own, king = OWN[color], KING[color]
+   for i in range(1, 51):
+      p = setup[i]
+      if p == '.': continue
+      if p in own:
+         if p == king: kings |= BIT[i]
+         else:         men |= BIT[i]
+      else:
+         if p.upper() == 'K': okings |= BIT[i]
+         else:                omen |= BIT[i]
+   return men, kings, omen, okings
+# end fromSetup
+
+
+def toSetup(men, kings, omen, okings, color=C.WHITE):     # PUBLIC
+   # Convert bitboards back to a setup (list of 52 char); own pieces get color
+   pcode = ('P', 'K', 'p', 'k') if color == C.WHITE else ('p', 'k', 'P', 'K')
+   setup = ['0'] + ['.'] * 50 + ['0']
+   for i in range(1, 51):
+      b = BIT[i]
+      if men & b:      setup[i] = pcode[0]
+      elif kings & b:  setup[i] = pcode[1]
+      elif omen & b:   setup[i] = pcode[2]
+      elif okings & b: setup[i] = pcode[3]
+   return setup
+# end toSetup
+
+
+def squares(mask):
+   # Generator for square numbers of bits in mask; ascending order
+   while mask:
+      b = mask & -mask
+      mask ^= b
+      yield b.bit_length()
+
+
+def quietMoves(men, kings, empty, color=C.WHITE):
+   # List of non-captures: men with shift-and-mask, kings with ray tables
+   moves = []
+   for d_shifts in FORWARD_SHIFTS[color]:
+      for delta, dmask in d_shifts:
+         if delta > 0: targets = ((men & dmask) << delta) & empty
+         else:         targets = ((men & dmask) >> -delta) & empty
+         for j in squares(targets):
+            moves.append(Move([ j - delta, j ], []))
+
+   for i in squares(kings):
+      for d_rays in RAYS:
+         for j in d_rays[i]:
+            if not BIT[j] & empty: break    # stop this direction if next square not empty
+            moves.append(Move([ i, j ], []))
+   return moves
+# end quietMoves
+
+
+def hasCaptureMask(men, kings, opp, empty):
+   # Returns True if any piece can capture. Men are checked in parallel with shifts.
+   for d_shifts in SHIFTS:
+      if shift( shift(men, d_shifts) & opp, d_shifts ) & empty: return True
+   for i in squares(kings):
+      for d_rays in RAYS:
+         seen = False
+         for j in d_rays[i]:
+            b = BIT[j]
+            if b & empty:
+               if seen: return True
+               continue
+            if seen or not b & opp: break    # own piece or second piece; stop
+            seen = True
+   return False
+# end hasCaptureMask
+
+
+def _bjumps(i, isKing, opp, empty):
+   # List of (over, land) one-take captures from square i.
+   # Parameter opp: opponent pieces that may still be taken; all others block.
+   result = []
+   if not isKing:
+      for d_jumps in JUMPS:
+         jump = d_jumps[i]
+         if jump is None: continue
+         if BIT[jump[0]] & opp and BIT[jump[1]] & empty:
+            result.append(jump)
+      return result
+
+   for d_rays in RAYS:
+      take = 0
+      for j in d_rays[i]:
+         b = BIT[j]
+         if b & empty:
+            if take: result.append((take, j))
+            continue
+         if take or not b & opp: break     # own, taken or second piece; stop
+         take = j
+   return result
+# end _bjumps
+
+
+def capturesFromSquare(i, isKing, opp, empty):
+   # Iterative make/unmake search of all complete captures from square i.
+   # Parameter empty must include square i (the moving piece leaves it).
+   # Returns (max takes, list of captures with max takes)
+   best = 0
+   result = []
+   steps = [i]
+   takes = []
+   taken = 0
+   stack = [ [_bjumps(i, isKing, opp, empty), 0] ]
+   while stack:
+      frame = stack[-1]
+      jumps, k = frame
+      if k < len(jumps):
+         frame[1] = k + 1
+         over, land = jumps[k]
+         empty = (empty | BIT[steps[-1]]) & ~BIT[land]    # make
+         taken |= BIT[over]
+         steps.append(land)
+         takes.append(over)
+         stack.append([_bjumps(land, isKing, opp & ~taken, empty), 0])
+         continue
+
+      stack.pop()
+      if len(jumps) == 0 and len(takes) > 0:
+         # completed capture; keep only captures with max takes
+         if len(takes) > best:
+            best = len(takes)
+            result = []
+         if len(takes) == best:
+            result.append(Move(list(steps), list(takes)))
+      if len(takes) > 0:
+         land = steps.pop()                                # unmake
+         taken &= ~BIT[takes.pop()]
+         empty = (empty | BIT[land]) & ~BIT[steps[-1]]
+   return best, result
+# end capturesFromSquare
+
+
+def genMoves(men, kings, omen, okings, color=C.WHITE):     # PUBLIC
+   # Returns list of all legal moves for the player with own men and kings.
+   # Parameter color gives the forward direction of the men.
+   opp = omen | okings
+   empty = ALL & ~(men | kings | opp)
+
+   if not hasCaptureMask(men, kings, opp, empty):
+      return quietMoves(men, kings, empty, color)
+
+   best = 0
+   captures = []
+   for i in squares(men | kings):
+      n, caps = capturesFromSquare(i, kings & BIT[i], opp, empty | BIT[i])
+      if n > best:
+         best = n
+         captures = caps
+      elif n == best and n > 0:
+         captures.extend(caps)
+   return captures
+# end genMoves
+
+
+def gen_moves(pos):       # PUBLIC
+   # Bitboard version of dxc100_moves.gen_moves
+   men, kings, omen, okings = fromSetup(pos.setup, pos.color)
+   return genMoves(men, kings, omen, okings, pos.color)
+# end gen_moves ============================================
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
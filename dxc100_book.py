@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Opening book; moves of positions played in PDN games
+| Remember:
+| - The book file starts with a header: MAGIC, Zobrist seed and max plies.
+|   Keys are only valid with the same C.ZOBRIST_SEED.
+| - Followed by fixed-width records (little-endian), sorted by key and move:
+|   key (Zobrist key of the colour-aware position, uint64), from, to (bytes),
+|   captured squares (bit k for square k, uint64), count (uint32: number
+|   of games with this move in this position).
+| - OpeningBook memory-maps the file; the records of a position are found
+|   by binary search on the key.
+| - Building streams the games: the moves of the first <plies> plies are
+|   counted in a dict of at most <runSize> items, written as sorted run
+|   files. The runs are merged (heapq.merge) into the book; counts of the
+|   same position and move are added. Memory is bounded by runSize.
+| - PDN: tags like [FEN "W:..."] give the starting position; comments {},
+|   variations () and move numbers are skipped. A game ends with a result
+|   (2-0, 0-2, 1-1, ...) or with the tags of the next game. A game is used
+|   up to its first illegal or unknown move.
+| Usage:
+| - python dxc100_book.py build <pdn file>... --output <book> [--plies N] [--min-count N]
+| - python dxc100_book.py probe <book> [fen or name]
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, os, re, struct, mmap, heapq, random, tempfile, time
+import argparse
+import dxc100_config as C
+from dxc100_position import parseFEN
+from dxc100_perft import lookupFEN
+from dxc100_classes import Moving
+
+MAGIC = "DXCBOOK1"
+HEADER = struct.Struct('<8sIH2x')      # magic, Zobrist seed, plies
+RECORD = struct.Struct('<QBBQI')       # key, from, to, captured squares, count
+KEY = struct.Struct('<Q')              # first field of a record
+MAXCOUNT = 0xFFFFFFFF
+
+RESULTS = ('2-0', '0-2', '1-1', '1-0', '0-1', '0-0', '*')
+TAG = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*\]')
+TOKEN = re.compile(r'[{}()]|[^\s{}()]+')
+MOVE = re.compile(r'^(?:\d+\.+)?(\d+(?:[-x:]\d+)+)')    # move, maybe with its number glued to it
+
+moving = Moving()
+
+def takesMask(takes):     # PUBLIC
+   # Captured squares as bits
+   mask = 0
+   for k in takes: mask |= 1 << k
+   return mask
+
+def maskTakes(mask):     # PUBLIC
+   return [ k for k in range(1, 51) if mask >> k & 1 ]
+
+
+def readPDN(infile):     # PUBLIC
+   # Generator of games (tags, moves) of a PDN file, read line by line.
+   # Tags: dict like {'FEN': 'W:...'}; moves: list of moves in user format.
+   tags, moves = {}, []
+   comment = False     # in {}
+   variation = 0       # depth of ()
+   for line in infile:
+      line = line.strip()
+      if line.startswith('%'): continue      # escape line
+      if not comment and variation == 0 and line.startswith('['):
+         if moves:
+            yield tags, moves
+            tags, moves = {}, []
+         for name, value in TAG.findall(line): tags[name] = value
+         continue
+      for token in TOKEN.findall(line):
+         if comment:
+            if token == '}': comment = False
+         elif token == '{':
+            comment = True
+         elif token == '(':
+            variation += 1
+         elif token == ')':
+            variation = max(0, variation - 1)
+         elif variation > 0:
+            continue
+         elif token in RESULTS:
+            if moves: yield tags, moves
+            tags, moves = {}, []
+         else:
+            match = MOVE.match(token)
+            if match: moves.append(match.group(1).replace(':', 'x'))
+   if moves: yield tags, moves
+   return
+# end readPDN
+
+
+def gameRecords(tags, moves, plies):     # PUBLIC
+   # Generator of (key, from, to, captured squares) of the first plies moves of a game
+   pos = parseFEN(tags.get('FEN', C.FEN_INITIAL), colorAware=True)
+   for umove in moves[:plies]:
+      move = pos.matchSteps(moving.parse_move(umove))
+      if move is None: break       # illegal: rest of game not used
+      yield pos.zkey, move.steps[0], move.steps[-1], takesMask(move.takes)
+      pos = pos.domove(move)
+   return
+# end gameRecords
+
+
+def writeRun(counts, directory):
+   # Sorted run file of dict {(key, from, to, captured): count}; returns file name
+   handle, fileName = tempfile.mkstemp(suffix='.run', dir=directory)
+   with os.fdopen(handle, 'wb') as out:
+      for item in sorted(counts.items()):
+         (key, frm, to, mask), count = item
+         out.write(RECORD.pack(key, frm, to, mask, min(count, MAXCOUNT)))
+   return fileName
+
+def readRecords(infile, chunk=4096):
+   # Generator of the records of a file as tuples; read in chunks of records
+   size = RECORD.size
+   while True:
+      data = infile.read(size * chunk)
+      for k in range(len(data) // size):
+         yield RECORD.unpack_from(data, k * size)
+      if len(data) < size * chunk: break
+   return
+
+
+def buildBook(pdnFiles, bookFile, plies=C.BOOK_PLIES, runSize=1000000, minCount=1, out=None):     # PUBLIC
+   # Build a book of the games of pdnFiles ('-': standard input). Returns (games, records).
+   directory = os.path.dirname(os.path.abspath(bookFile))
+   runs = []
+   counts = {}
+   games = 0
+   t0 = time.time()
+   try:
+      for fileName in pdnFiles:
+         infile = sys.stdin if fileName == '-' else open(fileName)
+         for tags, moves in readPDN(infile):
+            games += 1
+            for item in gameRecords(tags, moves, plies):
+               counts[item] = counts.get(item, 0) + 1
+            if len(counts) >= runSize:
+               runs.append(writeRun(counts, directory))
+               counts = {}
+         if infile is not sys.stdin: infile.close()
+      if counts: runs.append(writeRun(counts, directory))
+      counts = {}
+
+      # Merge the runs; items of the same position and move are added
+      records = 0
+      runFiles = [ open(fileName, 'rb') for fileName in runs ]
+      with open(bookFile, 'wb') as book:
+         book.write(HEADER.pack(MAGIC, C.ZOBRIST_SEED, plies))
+         last, total = None, 0
+         for rec in heapq.merge(*[ readRecords(f) for f in runFiles ]):
+            if rec[:4] == last:
+               total += rec[4]
+               continue
+            if last is not None and total >= minCount:
+               book.write(RECORD.pack(*(last + (min(total, MAXCOUNT),))))
+               records += 1
+            last, total = rec[:4], rec[4]
+         if last is not None and total >= minCount:
+            book.write(RECORD.pack(*(last + (min(total, MAXCOUNT),))))
+            records += 1
+      for f in runFiles: f.close()
+   finally:
+      for fileName in runs:
+         if os.path.exists(fileName): os.remove(fileName)
+   if out:
+      out.write("games %d  runs %d  records %d  time %.3f\n" % (games, len(runs), records, time.time() - t0))
+   return games, records
+# end buildBook
+
+
+class OpeningBook:
+   # Memory-mapped book file; see module doc
+
+   def __init__(self, fileName):
+      self.fileName = fileName
+      self.file = open(fileName, 'rb')
+      if os.fstat(self.file.fileno()).st_size < HEADER.size:
+         self.file.close()
+         raise Exception("no opening book: %s" % fileName)
+      self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      if self.data[:len(MAGIC)] != MAGIC:
+         self.close()
+         raise Exception("no opening book: %s" % fileName)
+      _, seed, self.plies = HEADER.unpack_from(self.data, 0)
+      if seed != C.ZOBRIST_SEED:
+         self.close()
+         raise Exception("opening book %s made with Zobrist seed %d (now %d)" % (fileName, seed, C.ZOBRIST_SEED))
+      self.size = (len(self.data) - HEADER.size) // RECORD.size    # number of records
+
+   def close(self):
+      self.data.close()
+      self.file.close()
+
+   def find(self, zkey):
+      # Index of the first record with key >= zkey (binary search)
+      data, size, start = self.data, RECORD.size, HEADER.size
+      lo, hi = 0, self.size
+      while lo < hi:
+         mid = (lo + hi) // 2
+         if KEY.unpack_from(data, start + mid * size)[0] < zkey:
+            lo = mid + 1
+         else:
+            hi = mid
+      return lo
+
+   def entries(self, zkey):
+      # Records of a position as list of (from, to, captured squares, count)
+      result = []
+      k = self.find(zkey)
+      while k < self.size:
+         key, frm, to, mask, count = RECORD.unpack_from(self.data, HEADER.size + k * RECORD.size)
+         if key != zkey: break
+         result.append( (frm, to, mask, count) )
+         k += 1
+      return result
+
+   def moves(self, pos):
+      # Legal book moves of a colour-aware position as list of (move, count); most played first
+      result = []
+      for frm, to, mask, count in self.entries(pos.zkey):
+         move = pos.matchStepsAndTakes([frm, to], maskTakes(mask))
+         if move is not None: result.append( (move, count) )
+      result.sort(key=lambda item: -item[1])
+      return result
+
+   def choose(self, pos, weighted=False):
+      # Book move of position: most played, or random weighted by count; None if not in book
+      moves = self.moves(pos)
+      if not moves: return None
+      if not weighted: return moves[0][0]
+      r = random.randint(1, sum( count for _, count in moves ))
+      for move, count in moves:
+         r -= count
+         if r <= 0: return move
+      return moves[-1][0]
+
+   def stats(self):
+      return "%s: %d records, %d plies" % (self.fileName, self.size, self.plies)
+
+# *** END class OpeningBook ***
+
+
+def bookPlayer(book, fallback, weighted=True):     # PUBLIC
+   # Player (see dxc100_session) that plays a book move if possible, else the move of fallback
+   def player(pos):
+      move = book.choose(pos, weighted)
+      return fallback(pos) if move is None else move
+   return player
+# end bookPlayer
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Build or probe an opening book')
+   sub = parser.add_subparsers(dest='command')
+   build = sub.add_parser('build', help='build a book of PDN games')
+   build.add_argument('pdn', nargs='+', help='PDN files (-: standard input)')
+   build.add_argument('--output', required=True, help='book file')
+   build.add_argument('--plies', type=int, default=C.BOOK_PLIES, help='moves per game in the book (plies)')
+   build.add_argument('--min-count', type=int, default=1, help='only moves played in at least N games')
+   build.add_argument('--run-size', type=int, default=1000000, help='max items in memory before a run is written')
+   probe = sub.add_parser('probe', help='show the book moves of a position')
+   probe.add_argument('book')
+   probe.add_argument('fen', nargs='?', default=C.FEN_INITIAL, help='FEN string or name like FEN_INITIAL')
+   args = parser.parse_args()
+
+   if args.command == 'build':
+      buildBook(args.pdn, args.output, args.plies, args.run_size, args.min_count, out=sys.stdout)
+   else:
+      book = OpeningBook(args.book)
+      pos = parseFEN(lookupFEN(args.fen)[1], colorAware=True)
+      t0 = time.time()
+      book.entries(pos.zkey)
+      t1 = time.time()
+      moves = book.moves(pos)
+      t2 = time.time()
+      print(book.stats())
+      for move, count in moves:
+         print("%-8s %d" % (moving.render_move(move), count))
+      print("%d book moves  lookup %.1f us  with legal moves %.1f us" % (len(moves), 1e6 * (t1 - t0), 1e6 * (t2 - t1)))
+      book.close()
+   return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: LRU cache with bounded size
+| Used to remember generated move lists of positions (key: Zobrist key).
+| (c) Arthur Kalverboer 2018
+|============================================================================
+"""
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+   # Cache of at most size items; the least recently used item is evicted first.
+   # Size 0 disables the cache. Safe to use from several threads.
+
+   def __init__(self, size):
+      self.size = size
+      self.data = OrderedDict()     # order: least recently used first
+      self.lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+   def get(self, key):
+      # Returns cached value or None
+      with self.lock:
+         value = self.data.pop(key, None)
+         if value is None:
+            self.misses += 1
+            return None
+         self.data[key] = value      # most recently used
+         self.hits += 1
+         return value
+
+   def put(self, key, value):
+      if self.size <= 0: return None
+      with self.lock:
+         self.data.pop(key, None)
+         self.data[key] = value
+         while len(self.data) > self.size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+      return None
+
+   def resize(self, size):
+      with self.lock:
+         self.size = size
+         while len(self.data) > max(size, 0):
+            self.data.popitem(last=False)
+            self.evictions += 1
+      return None
+
+   def clear(self):
+      with self.lock:
+         self.data.clear()
+         self.hits = self.misses = self.evictions = 0
+      return None
+
+   def stats(self):
+      # Summary of counters as a string
+      lookups = self.hits + self.misses
+      ratio = 100.0 * self.hits / lookups if lookups > 0 else 0.0
+      return "size %d/%d  hits %d  misses %d  evictions %d  hit ratio %.1f%%" % \
+             (len(self.data), self.size, self.hits, self.misses, self.evictions, ratio)
+
+# *** END class LRUCache ***
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
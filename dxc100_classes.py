@@ -11,8 +11,11 @@
 import re, sys
 import dxc100_config as C
 import socket
+from collections import namedtuple
 from dxc100_moves import Move
 
+Snapshot = namedtuple('Snapshot', 'pos color game')   # read-only view of a State
+
 class State:
    # A state of the application
    # - pos: position as defined in Position
@@ -28,29 +31,88 @@ class State:
    game['result'] = "0"  # unknown (0) OR I give up (1) OR draw (2) OR I win (3)
 
    def __init__(self, pos, color):
-      self.pos = pos      # "One-color" position. White always moves.
+      self.pos = pos      # Position; colour-aware (ColorPosition) or "one-color" (white always moves)
       self.color = color  # Player to move
 
    def clone(self):
       return State(self.pos, self.color)
 
+   def snapshot(self):
+      # View of the state for other threads: positions are immutable, game is a copy
+      return Snapshot(self.pos, self.color, dict(self.game))
+
    #def pos_to_fen(self):
 
 # *** END class State ***
 
+class MsgBuffer:
+   # Receive buffer for NUL-terminated (DXP) messages.
+   # Chunks are appended with feed(); pop() returns the messages one by one.
+   # Bytes after the last NUL stay buffered until the rest of the message arrives.
+   # Consumed bytes are only removed when the buffer is compacted.
+   #
+
+   def __init__(self):
+      self.buf = bytearray()
+      self.start = 0      # index of first byte not yet returned
+
+   def feed(self, chunk):
+      self.buf.extend(chunk)
+      return None
+
+   def pop(self):
+      # Next complete message (without NUL) or None
+      end = self.buf.find(b"\0", self.start)
+      if end < 0:
+         if self.start > 0:
+            del self.buf[:self.start]    # compact: keep only the incomplete message
+            self.start = 0
+         return None
+      msg = memoryview(self.buf)[self.start:end].tobytes()
+      self.start = end + 1
+      return msg
+
+   def messages(self):
+      # Generator of all complete messages in the buffer
+      msg = self.pop()
+      while msg is not None:
+         yield msg
+         msg = self.pop()
+
+   def pending(self):
+      # Number of buffered bytes of an incomplete message
+      return len(self.buf) - self.start
+
+   def clear(self):
+      self.buf = bytearray()
+      self.start = 0
+      return None
+
+# *** END class MsgBuffer ***
+
 class MySocket:
    # Socket class
    # New since Python 2.3: sock = socket.create_connection( (host,port), timeout=10 )
    #    It will try to resolve hostname for both AF_INET and AF_INET6
+   # Received messages are buffered (MsgBuffer): receive() returns one message
+   # at a time, also if several messages arrived in one chunk.
+   # Optional gamelog (GameLogWriter): sent and received messages are logged;
+   # the game number is raised by every GAMEREQ.
    #
 
-   def __init__(self):
+   MAXLEN = 4096   # max bytes of an incomplete message in the buffer
+
+   def __init__(self, gamelog=None):
       self.sock = None
+      self.rbuf = MsgBuffer()
+      self.gamelog = gamelog
+      self.gameId = 0
 
    def test(self, txt):
       print(txt)
 
    def open(self):
+      self.rbuf.clear()
       try:
          self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
       except:
@@ -96,15 +158,19 @@ class MySocket:
          self.sock.send(msg + "\0")
       except:
          raise Exception("send exception: no connection")
+      if self.gamelog is not None:
+         if msg[0:1] == "R": self.gameId += 1
+         self.gamelog.log(self.gameId, 0, msg)   # snd
       return None
    # def send(self)
 
    def receive(self):
-      msg = ""
-      while True:
+      # Next message; waits for data only if no complete message is buffered
+      msg = self.rbuf.pop()
+      while msg is None:
          # Collect message chunks until null character found
          try:
-            chunk = self.sock.recv(1024)
+            chunk = self.sock.recv(4096)
          except:
             raise Exception("receive exception: no connection")
             return None
@@ -112,19 +178,29 @@ class MySocket:
          if chunk == "":
             raise Exception("receive exception: socket connection broken")
             return None
-         msg += chunk
-         if msg.find("\0") > -1: break
-         if len(msg) > 128: break   # too long, no null char
+         self.rbuf.feed(chunk)
+         msg = self.rbuf.pop()
+         if msg is None and self.rbuf.pending() > self.MAXLEN:
+            self.rbuf.clear()
+            raise Exception("receive exception: message too long, no null char")
 
       #print("final msg: " + msg)
-      msg = msg.replace("\0","")   # remove all null chars
 
       # Use strip to remove all whitespace at the start and end.
       # Including spaces, tabs, newlines and carriage returns.
       msg = msg.strip()
+      if self.gamelog is not None:
+         if msg[0:1] == "R": self.gameId += 1
+         self.gamelog.log(self.gameId, 1, msg)   # rcv
       return msg
    # def receive(self)
 
+   def messages(self):
+      # Generator of incoming messages; stops with exception if connection broken
+      while True:
+         yield self.receive()
+   # def messages(self)
+
 # *** END class MySocket ***
 
 class DamExchange:
@@ -145,12 +221,12 @@ class DamExchange:
          result['type'] = "R"
          result['name'] = msg[3:35].strip()  # initiator
          result['fColor'] = msg[35:36]  # color of follower
-         result['gameTime'] = msg[36:40]
-         result['numMoves'] = msg[40:44]
-         result['posInd'] = msg[44:45]
+         result['gameTime'] = msg[36:39]
+         result['numMoves'] = msg[39:42]
+         result['posInd'] = msg[42:43]
          if result['posInd'] != "A":
-            result['mColor'] = msg[45:46]   # color to move for position
-            result['pos'] = msg[46:96]
+            result['mColor'] = msg[43:44]   # color to move for position
+            result['pos'] = msg[44:94]
       elif mtype == "A":  # GAMEACC
          result['type'] = "A"
          result['engineName'] = msg[1:33].strip()   # follower name
@@ -209,6 +285,17 @@ class DamExchange:
       return msg
    # msg_gamereq
 
+   def msg_gameacc(self, fName, accCode):
+      # Generate GAMEACC message (sent by FOLLOWER). Example: AMobyDam                         0
+      gameacc = []
+      gameacc.append("A")   # header
+      gameacc.append(fName.ljust(32)[:32])   # fName: name of follower, fixed length padding spaces
+      gameacc.append(str(accCode)[0])        # accCode: 0 > accepted  1..3 > not accepted
+      msg = ""
+      for item in gameacc: msg = msg + item
+      return msg
+   # msg_gameacc
+
    def msg_move(self, rmove, timeSpend):
       # Generate MOVE message. Example: M001205250422122320
       # Parm rmove is a "two-color" move
@@ -254,15 +341,15 @@ class DamExchange:
       backreq.append("K")
       backreq.append(str(accCode[0]))   # accCode
       msg = ""
-      for item in gameend: msg = msg + item
+      for item in backreq: msg = msg + item
       return msg
    # msg_backacc
 
    def dxpBoard(self, pos, color):
       pcode = {'P': 'w', 'K': 'W', 'p': 'z', 'k': 'Z', '.': 'e'}  # dxp spec
-      rpos = pos.clone() if color == C.WHITE else pos.rotate()  # mutual, real version
-      ##########board = [pcode[elem] for elem in rpos.setup[1:-1]]    # output list save for reuse
-      board = ''.join( str(pcode[elem]) for elem in rpos.setup[1:-1] )  # exclude 0's at begin and end
+      rsetup = pos.msetup(color)  # mutual, real version
+      ##########board = [pcode[elem] for elem in rsetup[1:-1]]    # output list save for reuse
+      board = ''.join( str(pcode[elem]) for elem in rsetup[1:-1] )  # exclude 0's at begin and end
       return board
 
 # *** END class DamExchange ***
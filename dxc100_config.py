@@ -14,10 +14,20 @@ INITIATOR = "DXC100 Client " + "(" + VERSION + ")"   # DamExchange protocol
 APPNAME = {'short':'DXC100', 'long':'DamExchange Client', 'github': 'dxc100_draughts_client'}
 SYSLOG_FILE = 'mysys.log'
 DXPLOG_FILE = 'mydxp.log'
+LOG_ASYNC = True           # log files written by a background thread (dxc100_asynclog); False: synchronous
+LOG_QUEUE_SIZE = 10000     # max number of log records waiting for the background thread
+LOG_QUEUE_POLICY = 'drop'  # queue full: 'drop' the record or 'block' the caller shortly, then drop
+GAMELOG_FILE = None        # binary game log of all DXP messages (dxc100_gamelog), like 'mygames.dxl'; None: off
+BOOK_FILE = None           # opening book (dxc100_book), like 'mybook.dxb'; None: no book
+BOOK_PLIES = 30            # number of plies of each game stored in a new opening book
 
 HOST = '127.0.0.1' # default host address of the server
 PORT = 27531       # default port DXP protocol
 PIECE_CHARSET = 0  # 0: utf-8 (unicodes);  1: ASCII (Windows console does not accept Unicode-only characters)
+MOVEGEN_BACKEND = 'list'   # move generator: 'list' (array of 52 char) or 'bitboard' (50-bit integers)
+ZOBRIST_SEED = 2018        # seed of the random numbers for Zobrist keys of positions
+MOVECACHE_SIZE = 10000     # max number of positions in the cache of legal moves (0: no cache)
+TT_SIZE_MB = 64            # memory budget in MB of a transposition table (problem solver, perft --hash)
 
 # The external respresentation of our board is a 100 character string.
 BOARD_EMPTY = ('0'
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Fast DXP message encoder and parser
+| Remember:
+| - DxpCodec has the same methods as DamExchange (same messages, same fields),
+|   for workloads with many messages: sessions, stand-in server and relay.
+| - MOVE, the bulk of the messages, is parsed into a light tuple (MoveMsg:
+|   namedtuple with __slots__ = ()) with the fixed-width layout of MOVE:
+|   the number of captured pieces is looked up (NCAPTURED) and the captured
+|   squares are read at precomputed offsets (SLOTS). Fields can be read as
+|   attribute (msg.to) or as before (msg['to']). Remember: field 'from' is
+|   attribute frm.
+| - A MOVE with a number of captured pieces out of 0..MAXTAKES raises
+|   ValueError, like other malformed numeric fields.
+| - Other messages are dicts, built like DamExchange.parse does: for one or
+|   two fields a dict is cheaper than a tuple class.
+| - Messages are encoded with % format strings made once per message type
+|   (MOVE: one per number of captured pieces).
+| Usage:
+| - python dxc100_dxp.py [--number N]   (benchmark against DamExchange)
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, timeit
+import argparse
+from collections import namedtuple
+import dxc100_config as C
+from dxc100_classes import DamExchange
+from dxc100_moves import Move
+
+ALIASES = {'from': 'frm'}    # dict key -> attribute of fields that are no identifier
+
+def _getitem(self, key):
+   # Field by name (like the dict of DamExchange.parse) or by index
+   if key.__class__ is str: return getattr(self, ALIASES.get(key, key))
+   return tuple.__getitem__(self, key)
+
+def _messageClass(name, fields):
+   base = namedtuple(name, ('type',) + fields)
+   return type(name, (base,), {'__slots__': (), '__getitem__': _getitem})
+
+MoveMsg = _messageClass('MoveMsg', ('time', 'frm', 'to', 'nCaptured', 'captures'))
+
+# Layout of MOVE: type, time (1:5), from (5:7), to (7:9), nCaptured (9:11), captured pieces from 11
+MAXTAKES = 20    # max pieces of one color
+NCAPTURED = dict( ('%02d' % n, n) for n in range(MAXTAKES + 1) )            # field -> number of captured pieces
+SLOTS = [ range(11, 11 + 2*n, 2) for n in range(MAXTAKES + 1) ]            # start of the fields of n captured pieces
+
+_tuple = tuple.__new__
+
+def parse(msg):     # PUBLIC
+   # Parse incoming DXP message; same fields as DamExchange.parse.
+   # MOVE: MoveMsg tuple. Other messages: dict, built like DamExchange.parse.
+   result = {}
+   mtype = msg[0:1]
+   if mtype == "C":  # CHAT
+      result['type'] = "C"
+      result['text'] = msg[1:127]
+   elif mtype == "R":  # GAMEREQ
+      result['type'] = "R"
+      result['name'] = msg[3:35].strip()
+      result['fColor'] = msg[35:36]
+      result['gameTime'] = msg[36:39]
+      result['numMoves'] = msg[39:42]
+      result['posInd'] = msg[42:43]
+      if result['posInd'] != "A":
+         result['mColor'] = msg[43:44]
+         result['pos'] = msg[44:94]
+   elif mtype == "A":  # GAMEACC
+      result['type'] = "A"
+      result['engineName'] = msg[1:33].strip()
+      result['accCode'] = msg[33:34]
+   elif mtype == "M":  # MOVE
+      field = msg[9:11]
+      n = NCAPTURED.get(field)
+      if n is None:
+         n = int(field)     # ValueError if no number
+         if not 0 <= n <= MAXTAKES: raise ValueError("invalid number of captured pieces: %r" % field)
+      return _tuple(MoveMsg, ("M", msg[1:5], msg[5:7], msg[7:9], field, [ msg[k:k+2] for k in SLOTS[n] ]))
+   elif mtype == "E":  # GAMEEND
+      result['type'] = "E"
+      result['reason'] = msg[1:2]
+      result['stop'] = msg[2:3]
+   elif mtype == "B":  # BACKREQ
+      result['type'] = "B"
+      result['moveId'] = msg[1:4]
+      result['mColor'] = msg[4:5]
+   elif mtype == "K":  # BACKACC
+      result['type'] = "K"
+      result['accCode'] = msg[1:2]
+   else:
+      result['type'] = "?"
+   return result
+# end parse
+
+# Formats of messages; MOVE has one format per number of captured pieces
+MOVE_FORMATS = [ "M%04d%02d%02d%02d" + "%02d" * n for n in range(MAXTAKES + 1) ]
+GAMEREQ_FORMAT = "R01%-32.32s%s%s%s"
+GAMEACC_FORMAT = "A%-32.32s%s"
+GAMEEND_FORMAT = "E%s1"
+BACKREQ_FORMAT = "B%03d%s"
+
+def encodeMove(rmove, timeSpend):     # PUBLIC
+   # MOVE message of a "two-color" move. Example: M001205250422122320
+   # Squares are 1..50, so no field is longer than two digits
+   takes = rmove.takes
+   args = (timeSpend % 10000, rmove.steps[0], rmove.steps[-1], len(takes))
+   if not takes: return MOVE_FORMATS[0] % args
+   return MOVE_FORMATS[len(takes)] % (args + tuple(takes))
+
+
+
+class DxpCodec(DamExchange):
+   # DamExchange with the fast parser and encoders of this module
+
+   parse = staticmethod(parse)
+
+   def msg_chat(self, str):
+      return "C" + str
+
+   def msg_gamereq(self, myColor, gameTime, numMoves, pos=None, colorToMove=None):
+      msg = GAMEREQ_FORMAT % (C.INITIATOR, 'Z' if myColor == C.WHITE else 'W',
+                              str(gameTime).zfill(3), str(numMoves).zfill(3))
+      if pos == None or colorToMove == None: return msg + "A"
+      return msg + "B" + ("W" if colorToMove == C.WHITE else "Z") + self.dxpBoard(pos, colorToMove)
+
+   def msg_gameacc(self, fName, accCode):
+      return GAMEACC_FORMAT % (fName, str(accCode)[0])
+
+   def msg_move(self, rmove, timeSpend):
+      return encodeMove(rmove, timeSpend)
+
+   def msg_gameend(self, reason):
+      return GAMEEND_FORMAT % str(reason)[0]
+
+   def msg_backreq(self, moveId, colorToMove):
+      return BACKREQ_FORMAT % (moveId % 1000, "W" if colorToMove == C.WHITE else "Z")
+
+   def msg_backacc(self, accCode):
+      return "K" + str(accCode[0])
+
+# *** END class DxpCodec ***
+
+
+#*******************************************************************************************
+# Benchmark
+
+SAMPLES = [
+   "M0012322800",
+   "M001205250422122320",
+   "CWhat do you think about move 35?",
+   "ADXC100 stand-in server          0",
+   "R01Tornado voor Windows 4.0        W060065A",
+   "E21",
+   "B005Z",
+   "K1",
+   "R01Tornado voor Windows 4.0        W060065BW" + "z" * 20 + "e" * 10 + "w" * 20,
+]
+
+def check():     # PUBLIC
+   # Returns True if DxpCodec gives the same results as DamExchange
+   old, new = DamExchange(), DxpCodec()
+   for msg in SAMPLES:
+      a, b = old.parse(msg), new.parse(msg)
+      for key in a:
+         if a[key] != b[key]: return False
+   for move in (Move([32, 28], []), Move([5, 25], [22, 12, 23, 20]), Move([46, 5], [37])):
+      for t in (0, 12, 99999):
+         if old.msg_move(move, t) != new.msg_move(move, t): return False
+   for msg in ("M0012322821", "M0012322899", "M00123228-1"):
+      try:
+         new.parse(msg)
+         return False        # invalid number of captured pieces accepted
+      except ValueError:
+         pass
+   for reason in (0, 1, '2', '3'):
+      if old.msg_gameend(reason) != new.msg_gameend(reason): return False
+   if old.msg_backreq(1005, C.BLACK) != new.msg_backreq(1005, C.BLACK): return False
+   if old.msg_gamereq(C.WHITE, "90", 40) != new.msg_gamereq(C.WHITE, "90", 40): return False
+   return True
+# end check
+
+
+def benchmark(number=100000, out=sys.stdout):     # PUBLIC
+   # Time per call (microseconds) of DamExchange and DxpCodec
+   old, new = DamExchange(), DxpCodec()
+   move = Move([5, 25], [22, 12, 23, 20])
+   cases = [
+      ("parse MOVE",    lambda: old.parse(SAMPLES[0]),         lambda: new.parse(SAMPLES[0])),
+      ("parse MOVE x4", lambda: old.parse(SAMPLES[1]),         lambda: new.parse(SAMPLES[1])),
+      ("parse CHAT",    lambda: old.parse(SAMPLES[2]),         lambda: new.parse(SAMPLES[2])),
+      ("parse GAMEACC", lambda: old.parse(SAMPLES[3]),         lambda: new.parse(SAMPLES[3])),
+      ("parse GAMEREQ", lambda: old.parse(SAMPLES[4]),         lambda: new.parse(SAMPLES[4])),
+      ("parse GAMEEND", lambda: old.parse(SAMPLES[5]),         lambda: new.parse(SAMPLES[5])),
+      ("parse BACKREQ", lambda: old.parse(SAMPLES[6]),         lambda: new.parse(SAMPLES[6])),
+      ("parse BACKACC", lambda: old.parse(SAMPLES[7]),         lambda: new.parse(SAMPLES[7])),
+      ("msg_move x4",   lambda: old.msg_move(move, 12),        lambda: new.msg_move(move, 12)),
+      ("msg_gameend",   lambda: old.msg_gameend(2),            lambda: new.msg_gameend(2)),
+      ("msg_backreq",   lambda: old.msg_backreq(5, C.BLACK),   lambda: new.msg_backreq(5, C.BLACK)),
+   ]
+   out.write("%-16s %12s %12s %8s\n" % ("us per call", "DamExchange", "DxpCodec", "speedup"))
+   for name, fold, fnew in cases:
+      # Old and new in turn, best of 7: load changes hit both
+      told = tnew = float('inf')
+      for _ in range(7):
+         told = min(told, timeit.timeit(fold, number=number))
+         tnew = min(tnew, timeit.timeit(fnew, number=number))
+      told, tnew = 1e6 * told / number, 1e6 * tnew / number
+      out.write("%-16s %12.3f %12.3f %7.2fx\n" % (name, told, tnew, told / tnew))
+   out.flush()
+   return None
+# end benchmark
+
+def main():
+   parser = argparse.ArgumentParser(description='Benchmark of the DXP encoder and parser')
+   parser.add_argument('--number', type=int, default=100000, help='calls per measurement')
+   args = parser.parse_args()
+   if not check():
+      print("DxpCodec differs from DamExchange")
+      return 1
+   benchmark(args.number)
+   return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
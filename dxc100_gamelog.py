@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Binary game log; compact append-only record of DXP messages
+| Remember:
+| - The file starts with MAGIC, followed by records (little-endian).
+|   Each record starts with: kind (1 char), direction (0 snd, 1 rcv),
+|   game number (uint32), time (double, seconds since epoch).
+| - Kind 'M': MOVE message in a fixed-width record: time spent (uint16),
+|   from, to, number of captures (bytes) and 20 bytes of captured squares.
+| - Kind 'T': any other message (CHAT, GAMEREQ, ...) in a length-prefixed
+|   record: length (uint16) followed by the message text.
+| - GameLogWriter writes the records from a background thread: messages are
+|   queued by log() and written and flushed in batches. A message that
+|   cannot be encoded is logged (logger SYS) and skipped.
+| - GameLogReader memory-maps the file for replay and queries without
+|   reading the whole file into memory.
+| Usage:
+| - python dxc100_gamelog.py <file> [--game N] [--type M] [--summary] [--replay]
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, os, time, struct, mmap, threading, Queue, logging
+import argparse
+from collections import namedtuple
+import dxc100_config as C
+from dxc100_dxp import parse, MOVE_FORMATS, MAXTAKES
+from dxc100_position import ColorPosition, dxpPosition
+from dxc100_classes import Moving
+
+MAGIC = "DXCLOG1\n"
+SND, RCV = 0, 1       # direction of a message
+DIRECTIONS = ('snd', 'rcv')
+
+HEADER = struct.Struct('<cBId')                          # kind, direction, game, time
+MOVE_RECORD = struct.Struct('<cBIdHBBB%ds' % MAXTAKES)   # header + time spent, from, to, nCaptured, captures
+TEXT_RECORD = struct.Struct('<cBIdH')                    # header + length of text
+MAXTEXT = 0xFFFF
+
+syslog = logging.getLogger('SYS')
+syslog.addHandler(logging.NullHandler())   # no warning if logging is not configured
+
+LogRecord = namedtuple('LogRecord', 'time game direction message')   # message: DXP text
+
+moving = Moving()
+
+def encodeRecord(t, game, direction, message):     # PUBLIC
+   # Binary record of one DXP message
+   game &= 0xFFFFFFFF
+   if message[0:1] == "M" and message[9:11].isdigit():
+      n = int(message[9:11])
+      if n <= MAXTAKES and len(message) == 11 + 2 * n:   # exactly the MOVE layout: no loss of data
+         try:
+            m = parse(message)
+            captures = bytearray( int(k) for k in m.captures )
+            return MOVE_RECORD.pack('M', direction, game, t, int(m.time), int(m.frm), int(m.to), n, bytes(captures))
+         except (ValueError, struct.error):
+            pass    # no valid MOVE: store as text
+   data = message[:MAXTEXT]
+   return TEXT_RECORD.pack('T', direction, game, t, len(data)) + data
+# end encodeRecord
+
+
+class GameLogWriter(threading.Thread):
+   # Background thread that appends records to a game log.
+   # log() only queues the message; the thread encodes the messages and
+   # writes them in batches of at most batchSize records, one write and one
+   # flush per batch. close() writes what is left in the queue.
+   #
+
+   def __init__(self, fileName, batchSize=512):
+      threading.Thread.__init__(self)
+      self.daemon = True
+      self.fileName = fileName
+      self.batchSize = batchSize
+      self.queue = Queue.Queue()
+      self.records = 0     # number of records written
+      self.batches = 0     # number of writes
+      self.file = open(fileName, 'ab')
+      if self.file.tell() == 0:
+         self.file.write(MAGIC)
+         self.file.flush()
+      self.start()
+
+   def log(self, game, direction, message, t=None):
+      # Queue a message; direction SND or RCV
+      self.queue.put((time.time() if t is None else t, game, direction, message))
+      return None
+
+   def run(self):
+      queue = self.queue
+      stop = False
+      while not stop:
+         batch = [ queue.get() ]    # wait for the first message
+         while len(batch) < self.batchSize:
+            try:
+               batch.append(queue.get_nowait())
+            except Queue.Empty:
+               break
+         if batch[-1] is None:      # close() called
+            batch.pop()
+            stop = True
+         if batch:
+            try:
+               self.write(batch)
+            except Exception as err:     # the writer keeps going
+               syslog.error("game log %s: %s" % (self.fileName, err))
+      self.file.close()
+      return None
+
+   def write(self, batch):
+      # Encode and write a batch of messages; a message that cannot be encoded is skipped
+      data = []
+      for item in batch:
+         try:
+            data.append(encodeRecord(*item))
+         except Exception as err:
+            syslog.error("game log %s: message not logged: %r: %s" % (self.fileName, item, err))
+      self.file.write(b"".join(data))
+      self.file.flush()
+      self.records += len(data)
+      self.batches += 1
+      return None
+
+   def close(self):
+      # Write the queued messages and close the file
+      if self.is_alive():
+         self.queue.put(None)
+         self.join()
+      return None
+
+# *** END class GameLogWriter ***
+
+
+class GameLogReader:
+   # Memory-mapped game log. Records are decoded when they are read.
+   # A record cut off at the end of the file (writer stopped) is ignored.
+   #
+
+   def __init__(self, fileName):
+      self.file = open(fileName, 'rb')
+      if os.fstat(self.file.fileno()).st_size > 0:
+         self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+      else:
+         self.data = ""
+      if self.data[:len(MAGIC)] != MAGIC:
+         self.close()
+         raise Exception("no game log: %s" % fileName)
+      self._index = None
+
+   def close(self):
+      if isinstance(self.data, mmap.mmap): self.data.close()
+      self.file.close()
+
+   def offsets(self):
+      # Generator of (offset, game) of all records
+      data = self.data
+      end = len(data)
+      offset = len(MAGIC)
+      while offset + HEADER.size <= end:
+         kind, _, game, _ = HEADER.unpack_from(data, offset)
+         if kind == 'M':
+            size = MOVE_RECORD.size
+         else:
+            if offset + TEXT_RECORD.size > end: break
+            size = TEXT_RECORD.size + TEXT_RECORD.unpack_from(data, offset)[4]
+         if offset + size > end: break
+         yield offset, game
+         offset += size
+      return
+
+   def record(self, offset):
+      # Record at offset as LogRecord
+      data = self.data
+      if data[offset] == 'M':
+         _, direction, game, t, spent, frm, to, n, captures = MOVE_RECORD.unpack_from(data, offset)
+         msg = MOVE_FORMATS[n] % ((spent, frm, to, n) + tuple(bytearray(captures[:n])))
+         return LogRecord(t, game, direction, msg)
+      _, direction, game, t, length = TEXT_RECORD.unpack_from(data, offset)
+      start = offset + TEXT_RECORD.size
+      return LogRecord(t, game, direction, data[start:start+length])
+
+   def index(self):
+      # Offsets of the records per game (built once)
+      if self._index is None:
+         self._index = {}
+         for offset, game in self.offsets():
+            self._index.setdefault(game, []).append(offset)
+      return self._index
+
+   def games(self):
+      return sorted(self.index())
+
+   def records(self, game=None, mtype=None):
+      # Generator of the records of one game (or all games), optionally only of message type mtype
+      if game is None:
+         offsets = ( offset for offset, _ in self.offsets() )
+      else:
+         offsets = self.index().get(game, [])
+      data = self.data
+      for offset in offsets:
+         if mtype is not None:
+            kind = data[offset]
+            if (kind == 'M') != (mtype == 'M'): continue
+            if kind == 'T' and data[offset+TEXT_RECORD.size:offset+TEXT_RECORD.size+1] != mtype: continue
+         yield self.record(offset)
+      return
+
+   def replay(self, game):
+      # Moves of a game (user format) and the final position (colour-aware).
+      # Starting position from the GAMEREQ of the game, if logged.
+      pos = ColorPosition(C.BOARD_START, C.WHITE)
+      moves = []
+      for rec in self.records(game):
+         mtype = rec.message[0:1]
+         if mtype == "R":
+            req = parse(rec.message)
+            if req["posInd"] == "B":
+               pos = dxpPosition(req["pos"], req["mColor"])
+            else:
+               pos = ColorPosition(C.BOARD_START, C.WHITE)
+            moves = []
+         elif mtype == "M":
+            try:
+               m = parse(rec.message)
+               move = pos.matchStepsAndTakes([int(m.frm), int(m.to)], map(int, m.captures))
+            except ValueError:
+               move = None     # malformed MOVE
+            if move is None:
+               raise Exception("illegal move in game %d: %s" % (game, rec.message))
+            moves.append(moving.render_move(move))
+            pos = pos.domove(move)
+      return moves, pos
+
+# *** END class GameLogReader ***
+
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Show or replay a binary game log')
+   parser.add_argument('file')
+   parser.add_argument('--game', type=int, help='only this game')
+   parser.add_argument('--type', help='only messages of this DXP type (C, R, A, M, E, B, K)')
+   parser.add_argument('--summary', action='store_true', help='number of messages per game')
+   parser.add_argument('--replay', action='store_true', help='moves and final position per game')
+   args = parser.parse_args()
+
+   reader = GameLogReader(args.file)
+   games = reader.games() if args.game is None else [args.game]
+   if args.summary:
+      for game in games:
+         print("game %d: %d messages" % (game, len(reader.index().get(game, []))))
+   elif args.replay:
+      for game in games:
+         moves, pos = reader.replay(game)
+         print("game %d: %s" % (game, ' '.join(moves)))
+         print("   %s" % pos.toFEN())
+   else:
+      for rec in reader.records(args.game, args.type):
+         t = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(rec.time)) + ("%.3f" % (rec.time % 1))[1:]
+         print("%s game %d %s %s" % (t, rec.game, DIRECTIONS[rec.direction], rec.message))
+   reader.close()
+   return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
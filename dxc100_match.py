@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Match runner; plays many games against a DXP server without a console
+| Remember:
+| - Games are played by DxpSession objects in one event loop; at most
+|   <concurrency> games are running at the same time.
+| - The moves of our side come from a player (see PLAYERS).
+| - Moves of the server are checked with Position.matchStepsAndTakes.
+|   Adjudication: an illegal move of the server is a win for us,
+|   a game longer than <max plies> is a draw.
+| - Report: results, games/sec and latency of the moves of the server.
+| - Optional: all messages of all games in a binary game log (dxc100_gamelog).
+| - Optional: an opening book (dxc100_book); the player is used after the book.
+| Usage:
+| - python dxc100_match.py [host] [port] [--games N] [--concurrency N] [--player name]
+|                          [--color W|B|alternate] [--max-plies N] [--fen FEN] [--gamelog FILE]
+|                          [--book FILE]
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, time, asyncore
+import argparse
+import dxc100_config as C
+from dxc100_session import DxpSession, firstPlayer, randomPlayer
+from dxc100_gamelog import GameLogWriter
+from dxc100_book import OpeningBook, bookPlayer
+
+PLAYERS = {'random': randomPlayer, 'first': firstPlayer}
+
+RESULTS = {'1': 'lost', '2': 'draw', '3': 'won'}
+
+class Match:
+   # A match of a number of games against one server.
+   # Colors: 'W', 'B' or 'alternate' (first game white).
+   #
+
+   def __init__(self, host, port, games, concurrency=1, player=randomPlayer, colors='alternate',
+                maxPlies=None, fen=None, gameTime=120, numMoves=50, gamelog=None):
+      self.host = host
+      self.port = port
+      self.games = games
+      self.concurrency = concurrency
+      self.player = player
+      self.colors = colors
+      self.maxPlies = maxPlies
+      self.fen = fen
+      self.gameTime = gameTime
+      self.numMoves = numMoves
+      self.gamelog = gamelog     # GameLogWriter or None
+      self.sockmap = {}
+      self.started = 0
+      self.running = []
+      self.finished = []
+      self.startTime = None
+      self.endTime = None
+
+   def color(self, gameNum):
+      if self.colors == 'W': return C.WHITE
+      if self.colors == 'B': return C.BLACK
+      return C.WHITE if gameNum % 2 == 0 else C.BLACK
+
+   def startGame(self):
+      session = DxpSession(self.host, self.port, self.color(self.started), self.player,
+                           self.gameTime, self.numMoves, self.fen, self.maxPlies,
+                           name="game%d" % (self.started + 1), sockmap=self.sockmap,
+                           gamelog=self.gamelog, gameId=self.started + 1)
+      self.started += 1
+      self.running.append(session)
+      return session
+
+   def run(self):
+      # Play all games; returns list of finished sessions
+      self.startTime = time.time()
+      while self.started < self.games or self.running:
+         while self.started < self.games and len(self.running) < self.concurrency:
+            try:
+               self.startGame()
+            except:
+               self.started += 1     # failed to start; count as game with error
+               self.finished.append(None)
+         asyncore.loop(timeout=1.0, map=self.sockmap, count=1, use_poll=True)
+         self.finished.extend( s for s in self.running if s.state == 'finished' )
+         self.running = [ s for s in self.running if s.state != 'finished' ]
+      self.endTime = time.time()
+      return self.finished
+   # def run()
+
+   def report(self, out=sys.stdout):
+      # Write results, games/sec and latencies
+      counts = {'won': 0, 'draw': 0, 'lost': 0, 'unknown': 0, 'error': 0}
+      latencies = []
+      plies = 0
+      for s in self.finished:
+         if s is None or (s.error is not None and s.result is None):
+            counts['error'] += 1
+            continue
+         counts[RESULTS.get(s.result, 'unknown')] += 1
+         latencies.extend(s.latencies)
+         plies += len(s.moves)
+      elapsed = (self.endTime or time.time()) - self.startTime
+      out.write("Games %d  won %d  draw %d  lost %d  unknown %d  errors %d\n" %
+                (len(self.finished), counts['won'], counts['draw'], counts['lost'],
+                 counts['unknown'], counts['error']))
+      out.write("Time %.3f sec  games/sec %.2f  plies %d  plies/sec %.1f\n" %
+                (elapsed, len(self.finished) / elapsed if elapsed > 0 else 0,
+                 plies, plies / elapsed if elapsed > 0 else 0))
+      if latencies:
+         latencies.sort()
+         n = len(latencies)
+         out.write("Move latency (ms): mean %.3f  median %.3f  p95 %.3f  max %.3f  (%d moves)\n" %
+                   (1000 * sum(latencies) / n, 1000 * latencies[n // 2],
+                    1000 * latencies[min(n - 1, int(n * 0.95))], 1000 * latencies[-1], n))
+      for s in self.finished:
+         if s is not None and s.error is not None:
+            out.write("%s: %s\n" % (s.name, s.error))
+      out.flush()
+      return counts
+   # def report()
+
+# *** END class Match ***
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Play a match of games against a DXP server')
+   parser.add_argument('host', nargs='?', default=C.HOST)
+   parser.add_argument('port', nargs='?', type=int, default=C.PORT)
+   parser.add_argument('--games', type=int, default=10)
+   parser.add_argument('--concurrency', type=int, default=1, help='number of games at the same time')
+   parser.add_argument('--player', choices=sorted(PLAYERS), default='random', help='move source of our side')
+   parser.add_argument('--color', choices=('W', 'B', 'alternate'), default='alternate', help='our color')
+   parser.add_argument('--max-plies', type=int, default=300, help='adjudicate a draw after N plies')
+   parser.add_argument('--fen', help='starting position (default initial position)')
+   parser.add_argument('--gamelog', metavar='FILE', help='append all messages to a binary game log')
+   parser.add_argument('--book', metavar='FILE', default=C.BOOK_FILE, help='play book moves of this opening book first')
+   args = parser.parse_args()
+
+   gamelog = GameLogWriter(args.gamelog) if args.gamelog else None
+   player = PLAYERS[args.player]
+   book = OpeningBook(args.book) if args.book else None
+   if book is not None: player = bookPlayer(book, player)
+   match = Match(args.host, args.port, args.games, args.concurrency, player,
+                 args.color, args.max_plies, args.fen, gamelog=gamelog)
+   match.run()
+   if gamelog is not None: gamelog.close()
+   if book is not None: book.close()
+   counts = match.report()
+   return 0 if counts['error'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,14 +5,21 @@
 | DXC100: Move logic for Draughts 100 International Rules
 | Remember:
 | - The internal respresentation of our board is a list (array) of 52 char
-| - Moves are always calculated for white (uppercase letters) at high numbers!!
+| - Moves are calculated for white (uppercase letters) at high numbers!!
 | - If black is to move, black and white are swapped and the board is rotated.
+| - Colour-aware positions (pos.color) are not rotated: moves are calculated
+|   for black (lowercase letters) with the black direction tables.
+| - Squares reachable from a square are precomputed at import in tuples
+|   (MAN_STEPS, MAN_JUMPS, KING_RAYS); the generators iterate these tuples.
+| - Positions keep the squares of their pieces per color (pos.pieces);
+|   generation and capture detection only visit those squares.
 | 
 | (c) Arthur Kalverboer 2018
 ============================================================================
 """
 
 from collections import OrderedDict, namedtuple
+import dxc100_config as C
 
 # Directions: external representation; table gives for each square the next square depending on direction
 NE_ext = (
@@ -84,91 +91,92 @@ def diagonal(i, d):
 
 directions = [NE, SE, SW, NW]
 
+# Tables per color (index C.WHITE or C.BLACK): own/opponent pieces, men, kings and
+# forward directions of men. White moves up (NE, NW), black moves down (SE, SW).
+OWN = ('PK', 'pk')
+OPP = ('pk', 'PK')
+MAN = ('P', 'p')
+KING = ('K', 'k')
+FORWARD = ((NE, NW), (SE, SW))
+
+# Precomputed per square (index 0-51), only for directions that are not empty:
+# MAN_STEPS[color][i]: forward neighbours of i
+# MAN_JUMPS[i]: (square jumped over, landing square) in all directions
+# KING_RAYS[i]: all squares from i per direction, nearest first
+MAN_STEPS = tuple( tuple( tuple( d[i] for d in dirs if d[i] != 0 ) for i in range(52) )
+                   for dirs in FORWARD )
+MAN_JUMPS = tuple( tuple( (d[i], d[d[i]]) for d in directions if d[i] != 0 and d[d[i]] != 0 )
+                   for i in range(52) )
+KING_RAYS = tuple( tuple( tuple(diagonal(i, d)) for d in directions if d[i] != 0 )
+                   for i in range(52) )
+
 Move = namedtuple('Move', 'steps takes')      # steps/takes are arrays of numbers 
 
-def bmoves_from_square(board, i):
+def bmoves_from_square(board, i, color=C.WHITE):
    # List of moves (non-captures) for square i
-   moves = []     # output list
    p = board[i]
-   if not p.isupper(): return []  # only moves for player; return empty list
+   if p == MAN[color]:
+      return [ Move([ i, j ], []) for j in MAN_STEPS[color][i] if board[j] == '.' ]
 
-   if p == 'P':
-      for d in directions:
-         q = board[d[i]]
-         if q == '0': continue       # direction empty; try next direction
-         if q == '.' and (d[i] == NE[i] or d[i] == NW[i]):
+   moves = []     # output list
+   if p == KING[color]:
+      for ray in KING_RAYS[i]:        # diagonal squares from i per direction
+         for j in ray:
+            if board[j] != '.': break     # stop this direction if next square not empty
             # move detected; save and continue
-            moves.append(Move([ i, d[i] ], []))
-
-   if p == 'K':
-      for d in directions:
-         take = None
-         for j in diagonal(i, d):     # diagonal squares from i in direction d
-            q = board[j]
-            if q == '0': break         # stay inside the board; stop with this diagonal
-            if q != '.': break         # stop this direction if next square not empty
-            if q == '.':
-               # move detected; save and continue
-               # BUG 21-03-2018: in next statement is d[i] replaced by j
-               moves.append(Move([ i, j ], []))
+            moves.append(Move([ i, j ], []))
    return moves
 # end bmoves_from_square ======================================
 
 
-def bcaptures_from_square(board, i):
+def bcaptures_from_square(board, i, color=C.WHITE):
    # List of one-take captures for square i
-   captures = []     # output list
    p = board[i]
-   if not p.isupper(): return []    # only captures for player; return empty list
-
-   if p == 'P':
-      for d in directions:
-         q = board[d[i]]        # first diagonal square
-         if q == '0': continue       # direction empty; try next direction
-         if q == '.' or q.isupper(): continue
-
-         if q.islower():
-            r = board[ d[d[i]] ]     # second diagonal square
-            if r == '0': continue         # no second diagonal square; try next direction
-            if r == '.':
-               # capture detected; save and continue
-               captures.append(Move([ i, d[d[i]] ], [ d[i] ]))
-
-   if p == 'K':
-      for d in directions:
+   opp = OPP[color]
+   if p == MAN[color]:
+      # capture: opponent piece on the first diagonal square, second one empty
+      return [ Move([ i, land ], [ over ]) for over, land in MAN_JUMPS[i]
+               if board[over] in opp and board[land] == '.' ]
+
+   captures = []     # output list
+   if p == KING[color]:
+      for ray in KING_RAYS[i]:        # diagonal squares from i per direction
          take = None
-         for j in diagonal(i, d):     # diagonal squares from i in direction d
+         for j in ray:
             q = board[j]
-            if q.isupper(): break        # own piece on this diagonal; stop
-            if q == '0': break           # stay inside the board; stop with this diagonal
-            if q.islower() and take == None:
+            if q == '.':
+               if take is not None:
+                  # capture detected; save and continue
+                  captures.append(Move([i,j], [take]))
+            elif q in opp and take is None:
                take = j      # square number of q
-               continue
-
-            if q.islower() and take != None: break 
-            if q == '.' and take != None:
-               # capture detected; save and continue
-               captures.append(Move([i,j], [take]))
-
+            else:
+               break         # own piece or second opponent piece on this diagonal; stop
    return captures
 # end bcaptures_from_square ======================================
 
 
-def basicMoves(board):
+def pieceSquaresOf(board, pieces):
+   # Squares of the board with a piece in pieces (scan of the whole board)
+   return [ i for i, p in enumerate(board) if p in pieces ]
+
+
+def basicMoves(board, color=C.WHITE, squares=None):
    # Return list of basic moves of board; either captures or normal moves
    # Basic moves are normal moves or one-take captures
+   # Parameter squares: squares of the pieces of color, if known (ascending)
    bmoves_of_board = []
    bcaptures_of_board = []
    hasCapture = False
+   if squares is None: squares = pieceSquaresOf(board, OWN[color])
 
-   for i, p in enumerate(board):
-      if not p.isupper(): continue
-      bcaptures = bcaptures_from_square(board, i)
+   for i in squares:
+      bcaptures = bcaptures_from_square(board, i, color)
       if len(bcaptures) > 0: hasCapture = True
       if hasCapture:
          bcaptures_of_board.extend( bcaptures )
       else:
-         bmoves = bmoves_from_square(board, i)
+         bmoves = bmoves_from_square(board, i, color)
          bmoves_of_board.extend( bmoves )
 
    if len(bcaptures_of_board) > 0:
@@ -179,90 +187,144 @@ def basicMoves(board):
 # end basicMoves
 
 
-def searchCaptures(board):
-   # Capture construction by extending incomplete captures with basic captures
-
-   def boundCaptures(board, capture, depth ):
-      # Recursive construction of captures.
-      # - board: current board during capture construction
-      # - capture: incomplete capture used to extend with basic captures
-      # - depth: not used
-      bcaptures = bcaptures_from_square(board, capture.steps[-1])   # new extends of capture
-
-      completed = True
-      for bcapture in bcaptures: 
-         if len(bcapture.takes) == 0: continue         # no capture; nothing to extend
-         if bcapture.takes[0] in capture.takes: continue      # do not capture the same piece
-
-         n_from = bcapture.steps[0]
-         n_to = bcapture.steps[-1]     # last step
-
-         new_board = list(board)   # clone the board and do the capture without taking pieces
-         new_board[n_from] = '.'
-         new_board[n_to] = board[n_from]
-
-         new_capture = Move(list(capture.steps), list(capture.takes))  # make copy of capture and extend it
-
-         new_capture.steps.append(bcapture.steps[1])
-         new_capture.takes.append(bcapture.takes[0])
-
-         completed = False
-         result = boundCaptures(new_board, new_capture, depth + 1)   # RECURSION
-
-      if completed:
-         # Update global variables
-         global captures
-         captures.append(capture)
-         global max_takes
-         max_takes = len(capture.takes) if len(capture.takes) > max_takes else max_takes
-
-      return 0
-   # end boundCaptures
-
-   # ============================================================================
-   global captures; captures = []       # result list of captures
-   global max_takes; max_takes = 0       # max number of taken pieces
-
-   depth = 0
-   bmoves = basicMoves(board)
-
-   for bmove in bmoves:
+def captureBound(board, origin, color=C.WHITE, oppSquares=None):
+   # Upper bound of the number of takes of a capture starting at square origin.
+   # Counts opponent pieces with empty squares at both sides of one of its diagonals;
+   # only those can be jumped. Pieces stay on the board until the capture is complete,
+   # so the bound does not change while the capture is constructed.
+   bound = 0
+   if oppSquares is None: oppSquares = pieceSquaresOf(board, OPP[color])
+   for i in oppSquares:
+      for k in (0, 1):     # diagonals NE-SW and SE-NW
+         a, b = directions[k][i], directions[k+2][i]
+         if a == 0 or b == 0: continue
+         if (board[a] == '.' or a == origin) and (board[b] == '.' or b == origin):
+            bound += 1
+            break
+   return bound
+# end captureBound
+
+
+def extendCaptures(board, i, takes, color=C.WHITE):
+   # One-take captures from square i of pieces not yet taken
+   return [ bcapture for bcapture in bcaptures_from_square(board, i, color)
+            if bcapture.takes[0] not in takes ]
+
+
+def searchCaptures(board, color=C.WHITE, squares=None, oppSquares=None):
+   # Capture construction by extending incomplete captures with basic captures.
+   # Iterative make/unmake search on a private copy of the board. All state is
+   # local to the call, so it can run simultaneously in several threads.
+   # Starting squares that cannot reach the current max takes are skipped.
+   # Parameters squares, oppSquares: piece squares of color and opponent, if known.
+   board = list(board)   # working copy; each make is undone by unmake
+   captures = []         # result list of captures with max takes
+   max_takes = 0         # max number of taken pieces
+   bounds = {}           # captureBound per starting square
+
+   for bmove in basicMoves(board, color, squares):
       if len(bmove.takes) == 0: break    # only moves, no captures; nothing to extend
-      n_from = bmove.steps[0]
-      n_to = bmove.steps[-1]     # last step
-
-      new_board = list(board)      # clone the board and do the capture without taking pieces
-      new_board[n_from] = '.'
-      new_board[n_to] = board[n_from]
-      result = boundCaptures(new_board, bmove, depth)
+      origin = bmove.steps[0]
+      if max_takes > 1:    # every basic capture reaches one take
+         if origin not in bounds: bounds[origin] = captureBound(board, origin, color, oppSquares)
+         if bounds[origin] < max_takes: continue   # prune: max takes not reachable
+
+      piece = board[origin]
+      steps = list(bmove.steps)
+      takes = list(bmove.takes)
+      board[origin] = '.'            # make: do the capture without taking pieces
+      board[steps[-1]] = piece
+
+      # Stack of [extends of capture, index of next extend to try]
+      stack = [ [extendCaptures(board, steps[-1], takes, color), 0] ]
+      while stack:
+         frame = stack[-1]
+         bcaptures, k = frame
+         if k < len(bcaptures):
+            frame[1] = k + 1
+            n_to = bcaptures[k].steps[-1]
+            board[steps[-1]] = '.'        # make
+            board[n_to] = piece
+            steps.append(n_to)
+            takes.append(bcaptures[k].takes[0])
+            stack.append([extendCaptures(board, n_to, takes, color), 0])
+            continue
+
+         stack.pop()
+         if len(bcaptures) == 0:
+            # Completed capture
+            if len(takes) > max_takes:
+               max_takes = len(takes)
+               captures = []
+            if len(takes) == max_takes:
+               captures.append(Move(list(steps), list(takes)))
+         if stack:
+            n_to = steps.pop()            # unmake
+            takes.pop()
+            board[n_to] = '.'
+            board[steps[-1]] = piece
+
+      board[steps[-1]] = '.'         # unmake
+      board[origin] = piece
 
    ##print("Max takes: " + str(max_takes))
-
-   result = [cap for cap in captures if len(cap.takes) == max_takes]
-   return result
+   return captures
 
 # end searchCaptures
 
 
 def hasCapture(pos):     # PUBLIC
-   # Returns True if capture for white found for position else False.
-   for i, p in enumerate(pos.setup):
-      if not p.isupper(): continue
-      bcaptures = bcaptures_from_square(pos.setup, i)
+   # Returns True if capture for the player to move (pos.color) found for position else False.
+   for i in pos.pieces[pos.color]:
+      bcaptures = bcaptures_from_square(pos.setup, i, pos.color)
       if len(bcaptures) > 0: return True 
    return False
 # end hasCapture
 
 
-def gen_moves(pos):       # PUBLIC
-   # Returns list of all legal moves of a board for player white (capital letters).
+def gen_moves_list(pos):       # PUBLIC
+   # Returns list of all legal moves of a board for the player to move (pos.color).
+   # For a "one-color" position this is always white (capital letters).
    # Move is a named tuple with array of steps and array of takes
    #
+   squares = pos.pieces[pos.color]     # only occupied squares are visited
    if hasCapture(pos):
-      legalMoves = searchCaptures(pos.setup)
+      legalMoves = searchCaptures(pos.setup, pos.color, squares, pos.pieces[1 - pos.color])
    else:
-      legalMoves = basicMoves(pos.setup)
+      legalMoves = basicMoves(pos.setup, pos.color, squares)
    return legalMoves
+# end gen_moves_list
+
+
+# Move generator backends: 'list' (this module) or 'bitboard' (dxc100_bitboard)
+BACKENDS = ('list', 'bitboard')
+backend = None          # name of the selected backend; see set_backend()
+_backend_gen = None     # gen_moves function of the selected backend
+
+def set_backend(name):     # PUBLIC
+   # Select the move generator used by gen_moves. Can be changed at runtime.
+   global backend, _backend_gen
+   if name == 'list':
+      _backend_gen = gen_moves_list
+   elif name == 'bitboard':
+      import dxc100_bitboard     # import here: dxc100_bitboard imports this module
+      _backend_gen = dxc100_bitboard.gen_moves
+   else:
+      raise Exception("unknown move generator: %s (choose from %s)" % (name, ', '.join(BACKENDS)))
+   if backend is not None and name != backend:
+      # Cached legal moves come from the old backend (other order of moves)
+      from dxc100_position import moveCache     # import here: dxc100_position imports this module
+      moveCache.clear()
+   backend = name
+   return None
+# end set_backend
+
+
+def gen_moves(pos):       # PUBLIC
+   # Returns list of all legal moves of a board for the player to move (pos.color).
+   # Move is a named tuple with array of steps and array of takes.
+   # The moves are generated by the selected backend (C.MOVEGEN_BACKEND at import).
+   return _backend_gen(pos)
 # end gen_moves ============================================
 
 
@@ -274,6 +336,8 @@ def isLegal(pos, move):     # PUBLIC
    return False
 # end isLegal
 
+set_backend(C.MOVEGEN_BACKEND)
+
 #*******************************************************************************************
 def main():
    print('nothing to do')
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Parallel tree walking with a pool of processes
+| Remember:
+| - Threads do not help: the GIL allows one thread at a time to run Python code.
+| - The game tree is expanded to a frontier of positions, and the positions
+|   are divided over the processes of a multiprocessing pool.
+| - Positions are shipped in compact form: (setup string, color to move).
+|   Transpositions in the frontier are merged; the number of paths is kept.
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import multiprocessing
+from dxc100_moves import gen_moves
+from dxc100_position import ColorPosition
+
+def numProcesses(processes):     # PUBLIC
+   # Number of processes to use; 0 or None means all cores
+   if not processes: return multiprocessing.cpu_count()
+   return processes
+
+def compact(pos):     # PUBLIC
+   # Compact picklable form of a position: (setup string, color to move).
+   # A "one-color" position is compacted as white to move.
+   return (pos.key(), pos.color)
+
+def expand(cpos):     # PUBLIC
+   # Colour-aware position of a compact position
+   setup, color = cpos
+   return ColorPosition(setup, color)
+
+def frontier(pos, depth):     # PUBLIC
+   # Positions at depth below pos: dict of compact position -> number of paths
+   level = {compact(pos): 1}
+   for d in range(depth):
+      nextLevel = {}
+      for cpos, npaths in level.items():
+         p = expand(cpos)
+         for move in gen_moves(p):
+            key = compact(p.domove(move))
+            nextLevel[key] = nextLevel.get(key, 0) + npaths
+      level = nextLevel
+   return level
+# end frontier
+
+
+def splitDepth(pos, depth, processes, minTasks=8):     # PUBLIC
+   # Smallest depth (below depth) with at least minTasks positions per process
+   d = 0
+   while d < depth - 1 and len(frontier(pos, d)) < minTasks * processes:
+      d += 1
+   return d
+# end splitDepth
+
+
+def runTasks(func, tasks, processes):     # PUBLIC
+   # Apply func to all tasks in a pool of processes. Returns list of results (same order).
+   # With one process the tasks are done in this process.
+   if processes <= 1 or len(tasks) <= 1:
+      return [ func(task) for task in tasks ]
+   pool = multiprocessing.Pool(processes)
+   try:
+      chunksize = max(1, len(tasks) // (processes * 4))
+      results = pool.map(func, tasks, chunksize)
+   finally:
+      pool.close()
+      pool.join()
+   return results
+# end runTasks
+
+def imapBatches(func, iterable, processes, batchSize=1000):     # PUBLIC
+   # Generator of func(item) for all items of iterable, in order.
+   # The iterable is read lazily in batches of batchSize items, so memory
+   # stays bounded for very large inputs. One pool is used for all batches.
+   if processes <= 1:
+      for item in iterable:
+         yield func(item)
+      return
+   pool = multiprocessing.Pool(processes)
+   try:
+      batch = []
+      for item in iterable:
+         batch.append(item)
+         if len(batch) >= batchSize:
+            for result in pool.map(func, batch, max(1, batchSize // (processes * 4))):
+               yield result
+            batch = []
+      if batch:
+         for result in pool.map(func, batch):
+            yield result
+   finally:
+      pool.close()
+      pool.join()
+# end imapBatches
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Perft (performance test) of the move generator
+| Counts the leaf nodes of the game tree of a position up to a given depth.
+| The counts are checked against a table of known values, so both the speed
+| and the correctness of the move generator (captures!) are tested. Only
+| FEN_INITIAL has published values; the others are regression values.
+| Usage:
+| - python dxc100_perft.py <fen or name> <depth> [--divide] [--backend name] [--color-aware] [--make]
+|                                                  [--processes N] [--hash MB]
+| - python dxc100_perft.py --verify <depth>    (all positions of PERFT_TABLE)
+| Name is a FEN constant of dxc100_config, like FEN_INITIAL or FEN_DXP100_3.
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, time
+import argparse
+import dxc100_config as C
+import dxc100_moves
+from dxc100_moves import gen_moves
+from dxc100_position import parseFEN, SearchPosition
+from dxc100_parallel import numProcesses, frontier, splitDepth, runTasks
+from dxc100_classes import Moving
+from dxc100_ttable import TranspositionTable
+
+# Known perft values per depth (index 0 is depth 1).
+# FEN_INITIAL is the well known perft of International Draughts. The other
+# values are regression values only: they come from the two move generators
+# of this program (list and bitboard), not from an independent source.
+REFERENCE = ('FEN_INITIAL',)     # positions with independently published values
+PERFT_TABLE = {
+   'FEN_INITIAL':  [9, 81, 658, 4265, 27117, 167140, 1049442],
+   'FEN_DXP100_1': [11, 20, 139, 469, 2411, 10991],
+   'FEN_DXP100_2': [7, 16, 40, 153, 646, 3065],
+   'FEN_DXP100_3': [12, 60, 698, 5105, 56460, 526134],
+   'FEN_DXP100_4': [10, 11, 73, 176, 790, 3148],
+   'FEN_DXP100_5': [11, 74, 435, 2012, 11181, 46664],
+   'FEN_DXP100_6': [9, 14, 104, 426, 3074, 12348],
+}
+
+def perft(pos, depth):     # PUBLIC
+   # Number of leaf nodes of position pos at depth
+   if depth == 0: return 1
+   moves = gen_moves(pos)
+   if depth == 1: return len(moves)
+   nodes = 0
+   for move in moves:
+      nodes += perft(pos.domove(move), depth - 1)
+   return nodes
+# end perft
+
+
+def perftMake(pos, depth):     # PUBLIC
+   # Perft with in-place make/unmake of a SearchPosition; no position per node
+   if depth == 0: return 1
+   moves = gen_moves(pos)
+   if depth == 1: return len(moves)
+   nodes = 0
+   for move in moves:
+      undo = pos.make(move)
+      nodes += perftMake(pos, depth - 1)
+      pos.unmake(undo)
+   return nodes
+# end perftMake
+
+
+def perftHash(pos, depth, tt):     # PUBLIC
+   # Perft with a transposition table: the count of a position reached by
+   # another move order is taken from the table (entry depth must match)
+   if depth == 0: return 1
+   if depth > 1:     # depth 1 costs no more than a probe
+      entry = tt.get(pos.zkey)
+      if entry is not None and entry[0] == depth: return entry[1]
+   moves = gen_moves(pos)
+   if depth == 1: return len(moves)
+   nodes = 0
+   for move in moves:
+      nodes += perftHash(pos.domove(move), depth - 1, tt)
+   tt.put(pos.zkey, depth, nodes)
+   return nodes
+# end perftHash
+
+
+def divide(pos, depth):     # PUBLIC
+   # List of (move, nodes) for every legal move of pos; nodes is perft at depth-1
+   result = []
+   for move in gen_moves(pos):
+      if isinstance(pos, SearchPosition):
+         undo = pos.make(move)
+         result.append( (move, perftMake(pos, depth - 1)) )
+         pos.unmake(undo)
+      else:
+         result.append( (move, perft(pos.domove(move), depth - 1)) )
+   return result
+# end divide
+
+
+def _perftTask(task):
+   # Worker of parallelDivide: perft of a compact position times its number of paths
+   backend, cpos, npaths, depth = task
+   if dxc100_moves.backend != backend: dxc100_moves.set_backend(backend)
+   setup, color = cpos
+   return npaths * perftMake(SearchPosition(setup, color), depth)
+
+
+def parallelDivide(pos, depth, processes=0):     # PUBLIC
+   # Parallel version of divide with a pool of processes (0: all cores).
+   # The tree below every root move is split at a frontier deep enough to keep all processes busy.
+   processes = numProcesses(processes)
+   moves = gen_moves(pos)
+   if depth <= 1: return [ (move, 1) for move in moves ]
+
+   split = max(splitDepth(pos, depth, processes) - 1, 0)    # frontier depth below the root moves
+   tasks = []
+   owner = []    # index of root move per task
+   for k, move in enumerate(moves):
+      for cpos, npaths in frontier(pos.domove(move), split).items():
+         tasks.append( (dxc100_moves.backend, cpos, npaths, depth - 1 - split) )
+         owner.append(k)
+
+   nodes = [0] * len(moves)
+   for k, n in zip(owner, runTasks(_perftTask, tasks, processes)):
+      nodes[k] += n
+   return list(zip(moves, nodes))
+# end parallelDivide
+
+
+def parallelPerft(pos, depth, processes=0):     # PUBLIC
+   # Parallel version of perft with a pool of processes (0: all cores)
+   if depth == 0: return 1
+   return sum( nodes for move, nodes in parallelDivide(pos, depth, processes) )
+# end parallelPerft
+
+
+def lookupFEN(arg):
+   # Parameter arg is a FEN string or the name of a FEN constant of dxc100_config.
+   # Returns (name or None, fen)
+   name = arg.upper()
+   if name == 'INITIAL': name = 'FEN_INITIAL'
+   if not name.startswith('FEN_'): name = 'FEN_' + name
+   if hasattr(C, name): return name, getattr(C, name)
+   for name in PERFT_TABLE:
+      if getattr(C, name) == arg: return name, arg
+   return None, arg
+# end lookupFEN
+
+
+def runPerft(arg, depth, showDivide=False, out=sys.stdout, colorAware=False, inPlace=False,
+             processes=1, hashMB=0):     # PUBLIC
+   # Perft for depth 1..depth with node counts, nodes/sec and check of known values.
+   # With colorAware the tree is walked with ColorPosition (no rotations).
+   # With inPlace the tree is walked with make/unmake of a SearchPosition (implies colorAware).
+   # With processes other than 1 the tree is walked by a pool of processes (0: all cores).
+   # With hashMB > 0 (one process, not inPlace) counts are remembered in a transposition table.
+   # Returns True if all known values are correct.
+   name, fen = lookupFEN(arg)
+   colorAware = colorAware or inPlace
+   pos = parseFEN(fen, colorAware)
+   if inPlace: pos = SearchPosition(pos.setup, pos.color, pos.zkey)
+   count = perftMake if inPlace else perft
+   tt = None
+   if hashMB > 0 and processes == 1 and not inPlace:
+      tt = TranspositionTable(hashMB)
+      count = lambda pos, depth: perftHash(pos, depth, tt)
+   if processes != 1:
+      processes = numProcesses(processes)
+      count = lambda pos, depth: parallelPerft(pos, depth, processes)
+   color = C.BLACK if fen.strip()[0] == 'B' else C.WHITE
+   known = PERFT_TABLE.get(name, [])
+   allOK = True
+
+   out.write("Perft %s (%s) with move generator %s%s\n" % (fen, name or 'unknown', dxc100_moves.backend,
+             ' (make/unmake)' if inPlace else ' (colour-aware)' if colorAware else ''))
+   if processes != 1: out.write("Parallel with %d processes\n" % processes)
+   if tt: out.write("Transposition table of %d entries\n" % tt.capacity())
+   if hashMB > 0 and not tt:
+      out.write("Transposition table not used: not with %s\n" % ('make/unmake' if inPlace else 'processes'))
+   for d in range(1, depth + 1):
+      t0 = time.time()
+      nodes = count(pos, d)
+      elapsed = time.time() - t0
+      nps = nodes / elapsed if elapsed > 0 else 0
+      if d <= len(known):
+         check = 'OK' if nodes == known[d-1] else 'ERROR (expected %d)' % known[d-1]
+         allOK = allOK and nodes == known[d-1]
+      else:
+         check = ''
+      out.write("depth %2d  nodes %12d  time %8.3f  nps %9d  %s\n" % (d, nodes, elapsed, nps, check))
+   if tt: out.write("table: %s\n" % tt.stats())
+
+   if showDivide:
+      moving = Moving()
+      total = 0
+      result = divide(pos, depth) if processes == 1 else parallelDivide(pos, depth, processes)
+      for move, nodes in result:
+         rmove = move if colorAware else moving.mreal_move(color, move)
+         out.write("%-10s %d\n" % (moving.render_move(rmove), nodes))
+         total += nodes
+      out.write("moves %d  nodes %d\n" % (len(gen_moves(pos)), total))
+   out.flush()
+   return allOK
+# end runPerft
+
+
+def verify(depth, out=sys.stdout, colorAware=False, inPlace=False, processes=1, hashMB=0):     # PUBLIC
+   # Check all positions of PERFT_TABLE up to depth. Returns True if all correct.
+   allOK = True
+   for name in sorted(PERFT_TABLE):
+      allOK = runPerft(name, min(depth, len(PERFT_TABLE[name])), out=out,
+                       colorAware=colorAware, inPlace=inPlace, processes=processes, hashMB=hashMB) and allOK
+   out.write("Perft verify: %s\n" % ('OK' if allOK else 'ERRORS FOUND'))
+   others = sorted( name for name in PERFT_TABLE if name not in REFERENCE )
+   out.write("(regression values only, from this program: %s)\n" % ', '.join(others))
+   return allOK
+# end verify
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Perft of the DXC100 move generator')
+   parser.add_argument('fen', nargs='?', default='FEN_INITIAL', help='FEN string or name like FEN_DXP100_3')
+   parser.add_argument('depth', nargs='?', type=int, default=5)
+   parser.add_argument('--divide', action='store_true', help='show node count per move')
+   parser.add_argument('--verify', type=int, metavar='DEPTH', help='check all known positions up to DEPTH')
+   parser.add_argument('--backend', choices=dxc100_moves.BACKENDS, help='move generator')
+   parser.add_argument('--color-aware', action='store_true', help='walk the tree without rotating the board')
+   parser.add_argument('--make', action='store_true', help='walk the tree with in-place make/unmake')
+   parser.add_argument('--processes', type=int, default=1, metavar='N',
+                       help='walk the tree with N processes (0: all cores)')
+   parser.add_argument('--hash', type=float, default=0, metavar='MB',
+                       help='count with a transposition table of MB megabytes')
+   args = parser.parse_args()
+   if args.hash > 0 and (args.make or args.processes != 1):
+      parser.error("--hash cannot be combined with --make or --processes")
+
+   if args.backend: dxc100_moves.set_backend(args.backend)
+   if args.verify:
+      ok = verify(args.verify, colorAware=args.color_aware, inPlace=args.make, processes=args.processes,
+                  hashMB=args.hash)
+   else:
+      ok = runPerft(args.fen, args.depth, args.divide, colorAware=args.color_aware, inPlace=args.make,
+                    processes=args.processes, hashMB=args.hash)
+   return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,12 +9,43 @@
 """
 
 import re, sys
+from bisect import insort
+from collections import namedtuple
 import dxc100_config as C
-from dxc100_moves import Move, gen_moves
-
-class Position:
+from dxc100_moves import gen_moves, KING
+from dxc100_zobrist import ZOBRIST, SIDEKEY, hashSetup, rotateKey
+from dxc100_cache import LRUCache
+
+moveCache = LRUCache(C.MOVECACHE_SIZE)   # legal moves of positions; key is Zobrist key
+
+PROMOTION = (range(1,6), range(46,51))   # promotion line per color (index C.WHITE or C.BLACK)
+
+Undo = namedtuple('Undo', 'move piece captured zkey')   # undo record of SearchPosition.make
+
+def pieceSquares(setup):     # PUBLIC
+   # Squares of the pieces per color (index C.WHITE or C.BLACK) in ascending order
+   white = tuple( i for i in range(1, 51) if setup[i] in 'PK' )
+   black = tuple( i for i in range(1, 51) if setup[i] in 'pk' )
+   return (white, black)
+# end pieceSquares
+
+def rotatePieces(pieces):     # PUBLIC
+   # Piece squares of the rotated board: colors swapped and square i becomes 51-i
+   white, black = pieces
+   return (tuple( 51-i for i in reversed(black) ), tuple( 51-i for i in reversed(white) ))
+# end rotatePieces
+
+def movePieces(pieces, color, i, j, takes):
+   # Piece squares after a move of color from square i to j taking the pieces on takes
+   own = [ k for k in pieces[color] if k != i ]
+   insort(own, j)
+   opp = tuple( k for k in pieces[1-color] if k not in takes ) if takes else pieces[1-color]
+   return (tuple(own), opp) if color == C.WHITE else (opp, tuple(own))
+# end movePieces
+
+class Position(object):
     # A position of a draughts 10x10 game
-    # Position stored as a list of 52 char; first and last index unused ('0') rotation-symmetry
+    # Position stored as a string of 52 char; first and last index unused ('0') rotation-symmetry
     # Coding:
     # - lowercase: black
     # - uppercase: white
@@ -25,31 +56,74 @@ class Position:
     # Parameter setup has two appearances: list of char or string of char.
     # The string can differ in that it has also spaces to visualize the board.
     # NB. In Python both list and string has the same methods.
+    # Attribute zkey is the 64-bit Zobrist key of the setup (see dxc100_zobrist).
+    # Parameter zkey can be given if already known, e.g. after an incremental update.
+    # Attribute pieces has the squares of the pieces per color (see pieceSquares);
+    # domove updates them, so move generation only visits occupied squares.
+    # Compact storage: __slots__ and an immutable string (one byte per square).
+    # The setup is never changed in place, so positions can share their setup.
+    # Attribute color is the player to move; always white for this class.
+    # See ColorPosition for positions that are not rotated every ply.
     #
 
-    def __init__(self, setup):
+    __slots__ = ('setup', 'zkey', 'pieces')
+    color = C.WHITE
+
+    def __init__(self, setup, zkey=None, pieces=None):
         if len(setup) == 52:
            # No spaces in setup
-           self.setup = list(setup)  # make a list clone
+           self.setup = setup if isinstance(setup, str) else "".join(setup)
         else:
            # Spaces added to setup (string, maybe list)
            str_setup = "".join(setup)  # convert to string regardless of type list or string
-           str_setup = str_setup.replace(" ","")   # remove all spaces
-           self.setup = list(str_setup)  # convert to list
+           self.setup = str_setup.replace(" ","")   # remove all spaces
+        self.zkey = hashSetup(self.setup) if zkey is None else zkey
+        self.pieces = pieceSquares(self.setup) if pieces is None else pieces
+
+    def __getstate__(self):
+        # Needed for pickle because of __slots__
+        return (self.setup, self.zkey)
+
+    def __setstate__(self, state):
+        self.setup, self.zkey = state
+        self.pieces = pieceSquares(self.setup)
 
     def key(self):
-        pos_key = ''.join(self.setup)    # array to string
-        return pos_key
+        return self.setup    # string of 52 char
 
     def rotate(self):
-        rotSetup = [ x.swapcase() for x in self.setup[::-1] ]  # clone!
-        return Position(rotSetup)
+        rotSetup = self.setup[::-1].swapcase()
+        return Position(rotSetup, rotateKey(self.zkey), rotatePieces(self.pieces))   # O(1) key of rotated position
 
     def clone(self):
-        return Position(self.setup)
+        return Position(self.setup, self.zkey, self.pieces)   # setup is immutable; no copy needed
+
+    def msetup(self, color):
+        # Setup of the real board ("two-color" version; mutual) if color is to move
+        return self.setup if color == C.WHITE else self.rotate().setup
+
+    def mpieces(self, color):
+        # Piece squares of the real board if color is to move
+        return self.pieces if color == C.WHITE else rotatePieces(self.pieces)
+
+    def toColor(self, color):
+        # Adapter: colour-aware position of this "one-color" position with color to move
+        if color == C.WHITE: return ColorPosition(self.setup, C.WHITE, self.zkey, self.pieces)
+        return ColorPosition(self.setup[::-1].swapcase(), C.BLACK, rotateKey(self.zkey) ^ SIDEKEY,
+                             rotatePieces(self.pieces))
+
+    def sizeof(self):
+        # Memory used by this position object in bytes
+        return sys.getsizeof(self) + sys.getsizeof(self.setup) + sys.getsizeof(self.zkey) + \
+               sys.getsizeof(self.pieces) + sum( sys.getsizeof(s) for s in self.pieces )
 
     def legalMoves(self):
-        return gen_moves(self)
+        # Legal moves from the cache if possible; returns a new list
+        moves = moveCache.get(self.zkey)
+        if moves is None:
+           moves = gen_moves(self)
+           moveCache.put(self.zkey, moves)
+        return list(moves)
 
     def domove(self, move):
         # Move is named tuple with list of steps and list of takes
@@ -71,13 +145,16 @@ class Position:
            setup[j] = 'K'
         else:
            setup[j] = p
+        zkey = self.zkey ^ ZOBRIST[p][i] ^ ZOBRIST[setup[j]][j]   # incremental key update
 
         # Capture
         for k in move.takes:
+           zkey ^= ZOBRIST[setup[k]][k]
            setup[k] = '.'
 
         # We rotate the returned position, so it's ready for the next player
-        posnew = Position(setup).rotate()
+        pieces = movePieces(self.pieces, C.WHITE, i, j, move.takes)
+        posnew = Position(setup, zkey, pieces).rotate()
 
         return posnew
     # def doMove()
@@ -85,29 +162,14 @@ class Position:
     def toFEN(self, colorToMove):
        # Parameter colorToMove: 0 white, 1 black
 
-       # Get setup mutual version
-       if colorToMove == C.WHITE: mSetup = self.setup
-       else:                      mSetup = self.rotate().setup
+       # Get setup and piece squares mutual version
+       mSetup = self.msetup(colorToMove)
+       mPieces = self.mpieces(colorToMove)
 
        sideToMove = str( ['W', 'B'][colorToMove] )   
 
-       whitePieces = ""
-       first = True
-       for num in range(1,51):
-          pieceCode = mSetup[num];
-          if pieceCode == 'P' and first == False: whitePieces += ","
-          if pieceCode == 'K' and first == False: whitePieces += ","
-          if pieceCode == 'P': whitePieces += str(num); first = False
-          if pieceCode == 'K': whitePieces += 'K' + str(num); first = False
-
-       blackPieces = ""
-       first = True
-       for num in range(1,51):
-          pieceCode = mSetup[num];
-          if pieceCode == 'p' and first == False: blackPieces += ","
-          if pieceCode == 'k' and first == False: blackPieces += ","
-          if pieceCode == 'p': blackPieces += str(num); first = False
-          if pieceCode == 'k': blackPieces += 'K' + str(num); first = False
+       whitePieces = ",".join( ('K' if mSetup[num] == 'K' else '') + str(num) for num in mPieces[C.WHITE] )
+       blackPieces = ",".join( ('K' if mSetup[num] == 'k' else '') + str(num) for num in mPieces[C.BLACK] )
 
        fenPosition = sideToMove + ":W" + whitePieces + ":B" + blackPieces + ".";
        return fenPosition
@@ -190,8 +252,185 @@ class Position:
 # *** END class Position ***
 
 
-def parseFEN(iFen):
-   """ Parses a string in Forsyth-Edwards Notation into a Position """
+class ColorPosition(Position):
+    # A colour-aware position: the setup is the real board and attribute color
+    # is the player to move (0:WHITE, 1:BLACK). Moves are generated for either
+    # color directly and are real ("two-color") moves, so the board is never
+    # rotated and moves need no remapping with 51-i.
+    # The Zobrist key includes SIDEKEY if black is to move.
+    # Method oneColor() is the adapter to the "one-color" Position.
+    #
+
+    __slots__ = ('color',)
+
+    def __init__(self, setup, color=C.WHITE, zkey=None, pieces=None):
+        if len(setup) == 52:
+           self.setup = setup if isinstance(setup, str) else "".join(setup)
+        else:
+           self.setup = "".join(setup).replace(" ","")   # remove all spaces
+        self.color = color
+        self.zkey = hashSetup(self.setup, color) if zkey is None else zkey
+        self.pieces = pieceSquares(self.setup) if pieces is None else pieces
+
+    def __getstate__(self):
+        return (self.setup, self.zkey, self.color)
+
+    def __setstate__(self, state):
+        self.setup, self.zkey, self.color = state
+        self.pieces = pieceSquares(self.setup)
+
+    def rotate(self):
+        # Mirrored position: colors swapped and board rotated
+        rotSetup = self.setup[::-1].swapcase()
+        return ColorPosition(rotSetup, 1 - self.color, rotateKey(self.zkey) ^ SIDEKEY, rotatePieces(self.pieces))
+
+    def clone(self):
+        return ColorPosition(self.setup, self.color, self.zkey, self.pieces)
+
+    def msetup(self, color=None):
+        return self.setup     # always the real board
+
+    def mpieces(self, color=None):
+        return self.pieces    # always the real board
+
+    def oneColor(self):
+        # Adapter: "one-color" position (white to move) of this position
+        if self.color == C.WHITE: return Position(self.setup, self.zkey, self.pieces)
+        return Position(self.setup[::-1].swapcase(), rotateKey(self.zkey ^ SIDEKEY), rotatePieces(self.pieces))
+
+    def domove(self, move):
+        # Move is a real move of the player to move.
+        # Returns new position object with the other player to move; no rotation.
+        zkey = self.zkey ^ SIDEKEY     # other player to move
+        if move is None: return ColorPosition(self.setup, 1 - self.color, zkey, self.pieces)
+
+        setup = list(self.setup)    # clone setup
+
+        # Actual move
+        i, j = move.steps[0], move.steps[-1]    # first, last (NB. sometimes i==j !)
+        p =  setup[i]
+
+        # Move piece and promote to king
+        king = KING[self.color]
+        setup[i] = '.'
+        if j in PROMOTION[self.color] and (p != king):
+           setup[j] = king
+        else:
+           setup[j] = p
+        zkey ^= ZOBRIST[p][i] ^ ZOBRIST[setup[j]][j]   # incremental key update
+
+        # Capture
+        for k in move.takes:
+           zkey ^= ZOBRIST[setup[k]][k]
+           setup[k] = '.'
+
+        pieces = movePieces(self.pieces, self.color, i, j, move.takes)
+        return ColorPosition(setup, 1 - self.color, zkey, pieces)
+    # def doMove()
+
+    def toFEN(self, colorToMove=None):
+       return Position.toFEN(self, self.color)
+
+    def mprint(self, color=None):
+       # Print position; the setup is already the real board
+       self.xprint()
+       return None
+
+# *** END class ColorPosition ***
+
+
+class SearchPosition(ColorPosition):
+    # A colour-aware position for search: the setup is a list of 52 char that is
+    # changed in place by make(move) and restored by unmake(undo).
+    # Only the squares of the move are changed; the Zobrist key and the piece
+    # squares (lists, kept in ascending order) are kept in sync.
+    # Example (perft):
+    #    undo = pos.make(move)
+    #    nodes += perft(pos, depth-1)
+    #    pos.unmake(undo)
+    # Remember: the setup is not shared, so clone() copies it.
+    #
+
+    __slots__ = ()
+
+    def __init__(self, setup, color=C.WHITE, zkey=None, pieces=None):
+        ColorPosition.__init__(self, setup, color, zkey, pieces)
+        self.setup = list(self.setup)     # mutable working copy
+        self.pieces = [ list(s) for s in self.pieces ]
+
+    def __setstate__(self, state):
+        ColorPosition.__setstate__(self, state)
+        self.pieces = [ list(s) for s in self.pieces ]
+
+    def key(self):
+        return "".join(self.setup)    # string of 52 char
+
+    def clone(self):
+        return SearchPosition(self.setup, self.color, self.zkey, self.pieces)
+
+    def freeze(self):
+        # Adapter: immutable ColorPosition of the current position
+        return ColorPosition(self.setup, self.color, self.zkey, tuple( tuple(s) for s in self.pieces ))
+
+    def rotate(self):
+        return self.freeze().rotate()
+
+    def oneColor(self):
+        return self.freeze().oneColor()
+
+    def make(self, move):
+        # Do move in place. Returns undo record (move, piece, captured pieces, old key).
+        setup = self.setup
+        undo = Undo(move, None, None, self.zkey)
+        zkey = self.zkey ^ SIDEKEY     # other player to move
+        if move is not None:
+           i, j = move.steps[0], move.steps[-1]    # first, last (NB. sometimes i==j !)
+           p = setup[i]
+           captured = [ setup[k] for k in move.takes ]
+           undo = Undo(move, p, captured, self.zkey)
+
+           king = KING[self.color]
+           setup[i] = '.'
+           setup[j] = king if j in PROMOTION[self.color] else p
+           zkey ^= ZOBRIST[p][i] ^ ZOBRIST[setup[j]][j]
+           for k, q in zip(move.takes, captured):
+              zkey ^= ZOBRIST[q][k]
+              setup[k] = '.'
+
+           own, opp = self.pieces[self.color], self.pieces[1 - self.color]
+           own.remove(i)
+           insort(own, j)
+           for k in move.takes: opp.remove(k)
+
+        self.zkey = zkey
+        self.color = 1 - self.color
+        return undo
+    # def make()
+
+    def unmake(self, undo):
+        # Take back the move of undo record (last make first)
+        move = undo.move
+        if move is not None:
+           setup = self.setup
+           setup[move.steps[-1]] = '.'
+           setup[move.steps[0]] = undo.piece      # piece before promotion
+           for k, q in zip(move.takes, undo.captured):
+              setup[k] = q
+
+           own, opp = self.pieces[1 - self.color], self.pieces[self.color]   # color is still the opponent
+           own.remove(move.steps[-1])
+           insort(own, move.steps[0])
+           for k in move.takes: insort(opp, k)
+        self.zkey = undo.zkey
+        self.color = 1 - self.color
+        return None
+    # def unmake()
+
+# *** END class SearchPosition ***
+
+
+def parseFEN(iFen, colorAware=False):
+   """ Parses a string in Forsyth-Edwards Notation into a Position (or ColorPosition) """
    fen = iFen                  # working copy
    fen = fen.replace(" ", "")  # remove all spaces
    fen = re.sub(r'\..*$', '', fen)   # cut off info (.xxx) at the end
@@ -225,10 +464,18 @@ def parseFEN(iFen):
    # prepare output
    pcode = {'w': 'P', 'W': 'K', 'b': 'p', 'B': 'k', '0': '.'}
    board = ['0'] + [pcode[elem] for elem in rlist[1:]] + ['0']
+   if colorAware: return ColorPosition(board, C.WHITE if sideToMove == 'W' else C.BLACK)
    pos = Position(board)
    return pos if sideToMove == 'W' else pos.rotate()
 # def parseFEN()
 
+def dxpPosition(board, mColor):     # PUBLIC
+   # Colour-aware position of a DXP board (50 char w, W, z, Z, e) with color mColor (W or Z) to move
+   pcode = {'w': 'P', 'W': 'K', 'z': 'p', 'Z': 'k', 'e': '.'}
+   setup = '0' + ''.join( pcode[elem] for elem in board ) + '0'
+   return ColorPosition(setup, C.WHITE if mColor == 'W' else C.BLACK)
+# def dxpPosition()
+
 #*******************************************************************************************
 def main():
    print('nothing to do')
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Relay mode; two DXP engines play each other with this client as referee
+| Remember:
+| - Both engines are servers (followers). The relay sends a GAMEREQ to both:
+|   engine A plays white, engine B plays black (swapped every next game).
+| - Every MOVE is checked with Position.matchStepsAndTakes and forwarded
+|   unchanged to the other engine. CHAT and GAMEEND are forwarded too.
+| - Adjudication: an illegal move or a move out of turn loses the game,
+|   a game longer than <max plies> is a draw.
+| - Non-blocking sockets in one asyncore event loop. A message is forwarded
+|   in the same event as it is received; the forward latency (receive to send)
+|   and the number of messages and bytes per direction are reported.
+| Usage:
+| - python dxc100_relay.py <hostA:portA> <hostB:portB> [--games N] [--max-plies N] [--fen FEN]
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, socket, asyncore, time, logging
+import argparse
+import dxc100_config as C
+from dxc100_classes import Moving, MsgBuffer
+from dxc100_dxp import DxpCodec
+from dxc100_position import ColorPosition, parseFEN
+
+dxp = DxpCodec()
+moving = Moving()
+dxplog = logging.getLogger('DXP')
+dxplog.addHandler(logging.NullHandler())   # no warning if logging is not configured
+
+class HopStats:
+   # Counters of the messages forwarded in one direction
+
+   def __init__(self, name):
+      self.name = name
+      self.messages = 0
+      self.bytes = 0
+      self.latencies = []    # seconds from receive to send of forwarded messages
+
+   def add(self, nbytes, latency):
+      self.messages += 1
+      self.bytes += nbytes
+      self.latencies.append(latency)
+
+   def stats(self, elapsed):
+      lat = sorted(self.latencies)
+      n = len(lat)
+      if n == 0: return "%s: no messages" % self.name
+      return "%s: %d msgs  %d bytes  %.1f msgs/sec  latency (us) mean %.1f  p95 %.1f  max %.1f" % \
+             (self.name, self.messages, self.bytes, self.messages / elapsed if elapsed > 0 else 0,
+              1e6 * sum(lat) / n, 1e6 * lat[min(n - 1, int(n * 0.95))], 1e6 * lat[-1])
+
+# *** END class HopStats ***
+
+
+class EngineLink(asyncore.dispatcher):
+   # Connection with one engine of the relay
+
+   def __init__(self, relay, host, port, color, sockmap):
+      asyncore.dispatcher.__init__(self, map=sockmap)
+      self.relay = relay
+      self.name = "%s:%s" % (host, port)
+      self.color = color         # color of the engine
+      self.accepted = False
+      self.engineName = self.name
+      self.inbuf = MsgBuffer()
+      self.outbuf = ""
+      self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+      self.connect((host, int(port)))
+
+   def send_msg(self, msg):
+      # Send now if possible; the rest is sent when the socket is writable
+      data = msg + "\0"
+      if not self.outbuf and self.connected:
+         try:
+            sent = self.socket.send(data)
+         except socket.error:
+            sent = 0
+         data = data[sent:]
+      self.outbuf += data
+      return None
+
+   def writable(self):
+      return len(self.outbuf) > 0 or not self.connected
+
+   def handle_write(self):
+      sent = self.send(self.outbuf)
+      self.outbuf = self.outbuf[sent:]
+
+   def handle_connect(self):
+      self.relay.connected(self)
+
+   def handle_read(self):
+      chunk = self.recv(4096)
+      tRecv = time.time()
+      if not chunk: return None
+      self.inbuf.feed(chunk)
+      for message in self.inbuf.messages():
+         message = message.strip()
+         if message: self.relay.handle_message(self, message[0:127], tRecv)
+      return None
+
+   def handle_close(self):
+      self.close()
+      self.relay.closed(self)
+
+   def handle_error(self):
+      self.relay.error = "%s: %s" % (self.name, sys.exc_info()[1])
+      self.handle_close()
+
+# *** END class EngineLink ***
+
+
+class Relay:
+   # One game between two engines. Engine A plays color colorA.
+   # Result: 'W' white wins, 'B' black wins, 'D' draw, None unknown.
+   #
+
+   def __init__(self, hostA, portA, hostB, portB, colorA=C.WHITE, fen=None, maxPlies=None,
+                gameTime=120, numMoves=50):
+      self.sockmap = {}
+      self.fen = fen
+      self.pos = ColorPosition(C.BOARD_START, C.WHITE) if fen is None else parseFEN(fen, colorAware=True)
+      self.maxPlies = maxPlies
+      self.gameTime = gameTime
+      self.numMoves = numMoves
+      self.moves = []
+      self.result = None
+      self.reason = None       # text
+      self.error = None
+      self.state = 'connecting'     # connecting, playing, ending, finished
+      self.endedBy = None           # link of the engine that sent GAMEEND (None: adjudicated)
+      self.startTime = self.endTime = None
+      self.linkA = EngineLink(self, hostA, portA, colorA, self.sockmap)
+      self.linkB = EngineLink(self, hostB, portB, 1 - colorA, self.sockmap)
+      self.hops = { self.linkA: HopStats("A->B"), self.linkB: HopStats("B->A") }
+      self.pending = { self.linkA: [], self.linkB: [] }   # (message, time) until both engines accepted
+
+   def other(self, link):
+      return self.linkB if link is self.linkA else self.linkA
+
+   def connected(self, link):
+      # Game request: the follower (engine) plays link.color
+      myColor = 1 - link.color
+      if self.fen is None:
+         msg = dxp.msg_gamereq(myColor, self.gameTime, self.numMoves)
+      else:
+         msg = dxp.msg_gamereq(myColor, self.gameTime, self.numMoves, self.pos, self.pos.color)
+      link.send_msg(msg)
+      dxplog.info("relay snd GAMEREQ %s: %s" % (link.name, msg))
+
+   def forward(self, link, message, tRecv):
+      # Forward message of link to the other engine
+      target = self.other(link)
+      if not target.accepted:
+         self.pending[link].append((message, tRecv))
+         return None
+      target.send_msg(message)
+      self.hops[link].add(len(message) + 1, time.time() - tRecv)
+      return None
+
+   def handle_message(self, link, message, tRecv):
+      dxpData = dxp.parse(message)
+      mtype = dxpData["type"]
+      dxplog.info("relay rcv %s: %s" % (link.name, message))
+      if mtype == "A":
+         if dxpData["accCode"] != "0":
+            return self.finish(None, "game request not accepted by %s: %s" % (link.name, dxpData["accCode"]))
+         link.accepted = True
+         link.engineName = dxpData["engineName"] or link.name
+         if self.linkA.accepted and self.linkB.accepted:
+            self.state = 'playing'
+            self.startTime = time.time()
+            for l in (self.linkA, self.linkB):
+               pending, self.pending[l] = self.pending[l], []
+               for m, t in pending: self.handle_message(l, m, t)
+
+      elif mtype == "M":
+         if self.state != 'playing':
+            self.pending[link].append((message, tRecv))
+            return None
+         if self.pos.color != link.color:
+            return self.adjudicate(1 - link.color, "move out of turn by %s: %s" % (link.engineName, message))
+         steps = [ int(dxpData['from']), int(dxpData['to']) ]
+         move = self.pos.matchStepsAndTakes(steps, map(int, dxpData['captures']))
+         if move is None:
+            return self.adjudicate(1 - link.color, "illegal move by %s: %s" % (link.engineName, message))
+         self.forward(link, message, tRecv)
+         self.moves.append(moving.render_move(move))
+         self.pos = self.pos.domove(move)
+         if self.maxPlies is not None and len(self.moves) >= self.maxPlies:
+            return self.adjudicate(None, "max plies reached")
+
+      elif mtype == "E":
+         if self.state == 'ending':
+            # Confirmation of the game end; forward it to the engine that ended the game
+            if self.endedBy is self.other(link): self.forward(link, message, tRecv)
+            return self.finish(self.result, self.reason)
+         # Reason seen from the sender: 1 I lose, 2 draw, 3 I win
+         reason = dxpData["reason"]
+         winner = {'1': 1 - link.color, '3': link.color}.get(reason)
+         self.result = 'D' if reason == '2' else (None if winner is None else 'WB'[winner])
+         self.reason = "game end by %s (reason %s)" % (link.engineName, reason)
+         self.forward(link, message, tRecv)
+         self.endedBy = link
+         self.state = 'ending'
+
+      elif mtype == "C":
+         self.forward(link, message, tRecv)
+
+      elif mtype == "B":
+         link.send_msg(dxp.msg_backacc("1"))    # not supported
+      return None
+   # def handle_message()
+
+   def adjudicate(self, winner, reason):
+      # End the game for both engines; winner is a color or None (draw)
+      self.result = 'D' if winner is None else 'WB'[winner]
+      self.reason = reason
+      for link in (self.linkA, self.linkB):
+         if winner is None: code = 2
+         else:              code = 3 if link.color == winner else 1
+         link.send_msg(dxp.msg_gameend(code))
+      self.state = 'ending'
+      return None
+
+   def finish(self, result, reason):
+      self.result = result
+      self.reason = reason
+      self.state = 'finished'
+      self.endTime = time.time()
+      for link in (self.linkA, self.linkB):
+         try:
+            while link.outbuf:
+               sent = link.send(link.outbuf)
+               if not sent: break
+               link.outbuf = link.outbuf[sent:]
+         except socket.error:
+            pass
+         link.close()
+      return None
+
+   def closed(self, link):
+      if self.state != 'finished':
+         self.finish(self.result, self.reason or "connection closed by %s" % link.name)
+
+   def run(self, timeout=1.0):
+      while self.sockmap:
+         asyncore.loop(timeout=timeout, map=self.sockmap, count=1, use_poll=True)
+      return self
+
+   def report(self, out=sys.stdout):
+      elapsed = (self.endTime or time.time()) - (self.startTime or time.time())
+      white = self.linkA if self.linkA.color == C.WHITE else self.linkB
+      black = self.other(white)
+      out.write("%s (white) - %s (black): %s  plies %d  %s\n" %
+                (white.engineName, black.engineName, self.result or '?', len(self.moves), self.reason or ''))
+      if self.error: out.write("error: %s\n" % self.error)
+      for link in (self.linkA, self.linkB):
+         out.write("   " + self.hops[link].stats(elapsed) + "\n")
+      out.flush()
+      return None
+
+# *** END class Relay ***
+
+def hostPort(arg):
+   host, _, port = arg.rpartition(':')
+   return (host or C.HOST), int(port)
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Relay: two DXP engines play each other')
+   parser.add_argument('engineA', help='host:port of engine A (white in the first game)')
+   parser.add_argument('engineB', help='host:port of engine B')
+   parser.add_argument('--games', type=int, default=1, help='number of games; colors swap every game')
+   parser.add_argument('--max-plies', type=int, default=300, help='adjudicate a draw after N plies')
+   parser.add_argument('--fen', help='starting position (default initial position)')
+   args = parser.parse_args()
+
+   hostA, portA = hostPort(args.engineA)
+   hostB, portB = hostPort(args.engineB)
+   score = {'A': 0.0, 'B': 0.0}
+   for game in range(args.games):
+      colorA = C.WHITE if game % 2 == 0 else C.BLACK
+      relay = Relay(hostA, portA, hostB, portB, colorA, args.fen, args.max_plies).run()
+      relay.report()
+      if relay.result == 'D':
+         score['A'] += 0.5
+         score['B'] += 0.5
+      elif relay.result in ('W', 'B'):
+         winA = (relay.result == 'W') == (colorA == C.WHITE)
+         score['A' if winA else 'B'] += 1
+   print("Score A %.1f - B %.1f" % (score['A'], score['B']))
+   return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
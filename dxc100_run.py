@@ -26,9 +26,18 @@ import re, sys, os, time
 import dxc100_config as C
 import threading
 import logging
-from dxc100_position import Position, parseFEN
+import Queue
+import StringIO
+from dxc100_position import ColorPosition, parseFEN, moveCache
 from dxc100_classes import State, DamExchange, MySocket, Moving
-from dxc100_moves import Move
+from dxc100_moves import Move, gen_moves
+import dxc100_moves
+import dxc100_perft
+import dxc100_solve
+from dxc100_gamelog import GameLogWriter
+from dxc100_asynclog import QueueHandler, QueueListener
+from dxc100_timing import TimingStats, GameClock
+from dxc100_book import OpeningBook
 
 def prompt() :
     sys.stdout.write('>>> ')
@@ -37,7 +46,10 @@ def prompt() :
 def initLogging():
    # Log names: ALERT, SYS, DXP
    # Levelnames: DEBUG, INFO, WARNING, ERROR and CRITICAL.
-   global dxplog, syslog, alert
+   # If C.LOG_ASYNC the log files are written by a listener thread; the loggers
+   # only put records in a bounded queue, so no thread waits for file I/O.
+   # Binary game log (if C.GAMELOG_FILE) of all messages of mySock.
+   global dxplog, syslog, alert, gamelog, logQueue, logListener
 
    dxplog = logging.getLogger('DXP')   # logfile
    syslog = logging.getLogger('SYS')   # logfile
@@ -54,15 +66,27 @@ def initLogging():
    hFileDxp = logging.FileHandler(filename=C.DXPLOG_FILE, mode='a')
    hFileDxp.setFormatter(formatter2)
 
+   hSys, hDxp = hFileSys, hFileDxp     # file handlers of the loggers
+   logQueue = logListener = None
+   if C.LOG_ASYNC:
+      logQueue = QueueHandler(Queue.Queue(C.LOG_QUEUE_SIZE), C.LOG_QUEUE_POLICY)
+      logListener = QueueListener(logQueue.queue, {'SYS': [hFileSys], 'ALERT': [hFileSys], 'DXP': [hFileDxp]})
+      hSys = hDxp = logQueue
+
    alert.setLevel(logging.INFO)
-   alert.addHandler(hConsole)
-   alert.addHandler(hFileSys)
+   alert.addHandler(hConsole)   # console output not queued
+   alert.addHandler(hSys)
 
    syslog.setLevel(logging.DEBUG)
-   syslog.addHandler(hFileSys)
+   syslog.addHandler(hSys)
 
    dxplog.setLevel(logging.DEBUG)
-   dxplog.addHandler(hFileDxp)
+   dxplog.addHandler(hDxp)
+
+   gamelog = None
+   if C.GAMELOG_FILE:
+      gamelog = GameLogWriter(C.GAMELOG_FILE)
+      mySock.gamelog = gamelog
 
    return None
 #  initLogging()
@@ -75,24 +99,309 @@ def clearLogFiles():
    return None
 #  clearLogFiles()
 
-def printSubscript():
-   # Subscript after displaying the board
-   colorString = str(['white', 'black'][current.color]) + ' to move '
-   if current.game['started'] == True:
-      if current.game['myColor'] == current.color:
+def printSubscript(snap):
+   # Subscript after displaying the board of snapshot snap
+   colorString = str(['white', 'black'][snap.color]) + ' to move '
+   if snap.game['started'] == True:
+      if snap.game['myColor'] == snap.color:
          player = " (You)"
       else:
-         player = " (" + current.game['engineName'] + ")"
+         player = " (" + snap.game['engineName'] + ")"
    else:
       player = ""  # no game
 
-   print(colorString + player) 
+   print(colorString + player)
 
    return None
 #  printSubscript()
 
+class DisplayHandler(threading.Thread):
+   # Subclass of Thread for all terminal output.
+   # Other threads queue texts, boards (snapshots of the game state) and prompts;
+   # they never wait for the terminal. Boards with timing stamps get the
+   # stamp 'render' when shown; the stamps are then added to timing.
+
+   def __init__(self):
+      threading.Thread.__init__(self)
+      self.daemon = True
+      self.items = Queue.Queue()
+
+   def show(self, text):
+      self.items.put(('text', text))
+
+   def board(self, snap, text=None, timed=None):
+      # Board and subscript of snapshot snap; optional text before the board.
+      # timed: (prefix, stamps, stages) for timing.addStamps or None
+      self.items.put(('board', snap, text, timed))
+
+   def prompt(self):
+      self.items.put(('prompt',))
+
+   def run(self):
+      while True:
+         item = self.items.get()
+         try:
+            if item[0] == 'text':
+               print(item[1])
+            elif item[0] == 'board':
+               _, snap, text, timed = item
+               if text is not None: print(text)
+               snap.pos.mprint(snap.color)
+               printSubscript(snap)
+               if timed is not None:
+                  prefix, stamps, stages = timed
+                  stamps['render'] = time.time()
+                  timing.addStamps(prefix, stamps, stages)
+            else:
+               prompt()
+         except:
+            syslog.error("Display error: %s" % sys.exc_info()[1])
+      return None
+   # def run(self)
+
+# CLASS DisplayHandler
+
+class GameHandler(threading.Thread):
+   # Subclass of Thread that owns the game state (current).
+   # Single writer: commands of the console and messages of the server are
+   # events in a queue, handled one by one by this thread; no other thread
+   # changes current. After each event the global view is replaced by a new
+   # snapshot, which the other threads read without a lock.
+   # Timing: each event is stamped at its stages (RCV_STAGES, CMD_STAGES);
+   # the durations go to timing with prefix 'rcv.<type>.' or 'cmd.<event>.'.
+   # The game clock runs from the acceptance of a game request; the time
+   # of our moves is sent in the MOVE messages.
+
+   RCV_STAGES = ('receive', 'handle', 'parse', 'validate', 'update', 'send', 'render')
+   CMD_STAGES = ('command', 'handle', 'validate', 'encode', 'send', 'update', 'render')
+
+   def __init__(self):
+      threading.Thread.__init__(self)
+      self.daemon = True
+      self.events = Queue.Queue()
+      self.clock = None      # GameClock of the last game
+      self.stamps = {}       # stamps of the event being handled
+      self.prefix = ''
+      self.timed = False     # stamps handed to the display
+
+   def post(self, event, *args):
+      # Queue event: handled by method on_<event>(*args)
+      self.events.put((event, args, time.time()))
+
+   def run(self):
+      global view
+      syslog.info("GameHandler started")
+      while True:
+         event, args, tPost = self.events.get()
+         received = (event == 'message')
+         self.stamps = {'handle': time.time(), ('receive' if received else 'command'): tPost}
+         self.prefix = 'rcv.' if received else 'cmd.%s.' % event
+         self.timed = False
+         try:
+            getattr(self, 'on_' + event)(*args)
+         except:
+            err = sys.exc_info()[1]
+            syslog.error("Event %s failed: %s" % (event, err))
+            display.show("Error: %s" % err)
+         view = current.snapshot()
+         if not self.timed: timing.addStamps(self.prefix, self.stamps, self.stages())
+         if not received: display.prompt()   # command of the console done
+      return None
+   # def run(self)
+
+   def stages(self):
+      return self.RCV_STAGES if 'receive' in self.stamps else self.CMD_STAGES
+
+   def stamp(self, stage):
+      self.stamps[stage] = time.time()
+
+   def showBoard(self, text=None):
+      # Board of the current state; the display adds the render time to the stamps of this event
+      display.board(current.snapshot(), text, (self.prefix, self.stamps, self.stages()))
+      self.timed = True
+
+   def send(self, msg, mtype):
+      # Send message to the server; returns False if failed
+      try:
+         mySock.send(msg)
+         self.stamp('send')
+         dxplog.info("snd %s: %s" % (mtype, msg))
+      except:
+         err = sys.exc_info()[1]
+         display.show("Error sending %s message: %s" % (mtype, err))
+         return False
+      return True
+
+   # *** Commands of the console ***
+
+   def on_setup(self, pos):
+      global current
+      if current.game['started'] == True:
+         display.show("Game started; setup not allowed")
+         return None
+      current = State(pos, pos.color)
+      display.board(current.snapshot())
+
+   def on_move(self, lmove):
+      if not lmove in current.pos.legalMoves():   # position changed after the check of the console
+         display.show("Illegal move; please enter a legal move")
+         return None
+      self.stamp('validate')
+      if current.game['started'] == True:
+         if current.game['myColor'] != current.color:
+            display.show("Move not allowed; server has to move")
+            return None
+         # *** outgoing MOVE message ***
+         # Time spend for this move: seconds since the move of the server (or the game start)
+         timeSpend = int(round(self.clock.running(self.stamps['command'])))
+         # Moves of a colour-aware position are real ("two-color") moves
+         msg = dxp.msg_move(lmove, timeSpend)
+         self.stamp('encode')
+         if not self.send(msg, "MOVE"): return None
+         timing.add('clock.client', self.clock.switch(self.stamps['command']))
+
+      # Update position and color to move
+      current.pos = current.pos.domove(lmove)
+      current.color = 1-current.color   # alternating: 0 and 1 (White and Black)
+      self.stamp('update')
+      self.showBoard()
+
+   def on_chat(self, txt):
+      self.send(dxp.msg_chat(txt), "CHAT")
+
+   def on_gamereq(self, myColor, gameTime, numMoves):
+      if current.game['started'] == True:
+         display.show("Game already started; gamereq not allowed")
+         return None
+      current.game['myColor'] = myColor    # 0 or 1
+      current.game['gameTime'] = gameTime
+      current.game['numMoves'] = numMoves
+      self.send(dxp.msg_gamereq(myColor, gameTime, numMoves, current.pos, current.color), "GAMEREQ")
+
+   def on_gameend(self, reason):
+      if current.game['started'] == False:
+         display.show("Game already finished; gameend not allowed")
+         return None
+      if current.game['myColor'] != current.color:
+         display.show("Message gameend not allowed; wait until your turn")
+         return None
+      if self.send(dxp.msg_gameend(reason), "GAMEEND"):
+         current.game['started'] = False   # stop game
+         current.game['result'] = reason
+         self.clock.stop()
+
+   def on_send(self, msg, mtype):
+      # Message without change of the state (tests)
+      self.send(msg, mtype)
+
+   def on_stats(self, arg=None, fileName=None):
+      # Timing statistics and game clock: show, 'clear' or 'dump' as JSON (to fileName or the display)
+      if arg == 'clear':
+         timing.clear()
+         display.show("Timing statistics cleared")
+      elif arg == 'dump':
+         extra = {'clock': self.clock.state() if self.clock else None}
+         if fileName is None:
+            out = StringIO.StringIO()
+            timing.dump(out, extra)
+            display.show(out.getvalue().rstrip('\n'))
+         else:
+            with open(fileName, 'w') as out:
+               timing.dump(out, extra)
+            display.show("Timing statistics written to %s" % fileName)
+      else:
+         display.show(timing.report())
+         if self.clock is not None: display.show("Game clock:\n" + self.clock.status())
+
+   # *** Messages of the server ***
+
+   def on_message(self, message):
+      message = message[0:127]  # DXP max length
+      dxpData = dxp.parse(message)
+      self.stamp('parse')
+      self.prefix = 'rcv.%s.' % dxpData["type"]
+      if dxpData["type"] == "C":
+         dxplog.info("rcv CHAT: " + message)
+         display.show("\nChat message: " + dxpData["text"])
+         display.prompt()
+
+      elif dxpData["type"] == "A":
+         dxplog.info("rcv GAMEACC: " + message)
+         if dxpData["accCode"] == "0":
+            current.game['started'] = True
+            current.game['myColor'] = current.game['myColor']  # as requested
+            current.game['engineName'] = dxpData["engineName"]
+            current.game['startingTime'] = self.stamps['receive']
+            self.clock = GameClock(current.game.get('gameTime', 120), current.game.get('numMoves', 50), current.color)
+            self.clock.start(self.stamps['receive'])
+            text = "\nGame request accepted by " + dxpData["engineName"]
+         else:
+            current.game['started'] = False
+            text = "\nGame request NOT accepted by " + dxpData["engineName"] + " Reason: " + dxpData["accCode"]
+         self.showBoard(text)
+         display.prompt()
+
+      elif dxpData["type"] == "E":
+         dxplog.info("rcv GAMEEND: " + message)
+         display.show("\nRequest end of game accepted. Reason: " + dxpData["reason"] + " Stop: " + dxpData["stop"])
+         display.prompt()
+         # Confirm game end by sending message back (if not sent by me)
+         if current.game['started'] == True:
+            current.game['started'] = False
+            current.game['result'] = dxpData["reason"]
+            self.clock.stop()
+            self.send(dxp.msg_gameend(dxpData["reason"]), "GAMEEND")
+
+      elif dxpData["type"] == "M":
+         dxplog.info("rcv MOVE: " + message)
+         steps = [ dxpData['from'], dxpData['to'] ]
+         nsteps = map( int, steps )
+         ntakes = map( int, dxpData['captures'] )
+         rmove_dxp = Move(nsteps, ntakes)   # namedtuple, a real move from host
+         xmove = current.pos.matchStepsAndTakes(rmove_dxp.steps, rmove_dxp.takes) # the system move
+         self.stamp('validate')
+
+         if xmove != None:
+            # Update position and color to move
+            current.pos = current.pos.domove(xmove)
+            current.color = 1-current.color   # alternating: 0 and 1 (White and Black)
+            self.stamp('update')
+            if self.clock is not None and current.game['started'] == True:
+               timing.add('clock.server', self.clock.switch(self.stamps['receive']))
+            self.showBoard("\nMove received: " + moving.render_move(xmove))
+         else:
+            display.show("Error: received move is illegal [" + message + "]")
+         display.prompt()
+
+      elif dxpData["type"] == "B":
+         # For the time being do not confirm request from server: send message back.
+         dxplog.info("rcv BACKREQ: " + message)
+         accCode = "1"   # 0: BACK YES; 1: BACK NO; 2: CONTINUE
+         self.send(dxp.msg_backacc(accCode), "BACKACC")
+
+      elif dxpData["type"] == "K":
+         # Answer to my request to move back
+         dxplog.info("rcv BACKACC: " + message)
+         display.show("rcv BACKACC: " + message)   # TEST
+         accCode = dxpData['accCode']
+         if accCode == "0":
+            # Actions to go back in history as specified in my request
+            display.show("TODO: actions to move back")
+            pass   # TODO
+
+      else:
+         dxplog.info("rcv UNKNOWN: " + message)
+         display.show("\nrcv Unknown message: " + message)
+         display.prompt()
+      return None
+   # def on_message(self)
+
+# CLASS GameHandler
+
 class ConsoleHandler(threading.Thread):
    # Subslass of Thread to handle console input from user.
+   # Reads the game state from the snapshot view; changes of the state are
+   # posted to the GameHandler. Output goes to the DisplayHandler.
 
    def __init__(self):
       threading.Thread.__init__(self)
@@ -104,7 +413,7 @@ class ConsoleHandler(threading.Thread):
 
       syslog.info("ConsoleHandler started")
 
-      global current, mySock, lock
+      global mySock, book
       stack = []
       stack.append('setup')          # initial board
 
@@ -112,29 +421,27 @@ class ConsoleHandler(threading.Thread):
          if stack:
             comm = stack.pop()
          else:
-            prompt()
             comm = sys.stdin.readline()   # blocked until user entered a message
+         snap = view    # game state at this command
 
          if comm.startswith('q') or comm.startswith('ex'):  # quit/exit
             syslog.info("Command terminate program: %s" %comm.strip() )
+            if gamelog is not None: gamelog.close()   # write queued messages
+            if logListener is not None: logListener.stop()
             os._exit(1)   # does no cleanups
 
          elif comm.startswith('legal'):  # show legal moves
-            lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
             syslog.info("Command show legal moves: %s" %comm.strip() )
-            current.pos.mprint(current.color)
-            printSubscript()
-            lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
             lstring = ''
-            for lmove in current.pos.legalMoves():
-               lstring += moving.mrender_move(current.color, lmove) + '  '
-            print("Legal moves: " + lstring)
+            for lmove in snap.pos.legalMoves():
+               lstring += moving.render_move(lmove) + '  '
+            display.board(snap)
+            display.show("Legal moves: " + lstring)
 
          elif comm.startswith('setup'):
-            if current.game['started'] == True:
-               print("Game started; setup not allowed")
-               continue
-            if len(comm.split()) == 1:
+            if snap.game['started'] == True:
+               display.show("Game started; setup not allowed")
+            elif len(comm.split()) == 1:
                # Setup starting position
                syslog.info("Command setup starting position: %s" %comm.strip() )
                b = 0  # TEST different positions
@@ -144,292 +451,320 @@ class ConsoleHandler(threading.Thread):
                   board = C.BOARD_TEST_02  # test position
                elif b == 2:
                   board = C.BOARD_PROBLEM_01   # test problem solving 1
-               current = State(Position(board), C.WHITE)
+               game.post('setup', ColorPosition(board, C.WHITE))
+               continue
             elif len(comm.split()) == 2:
                # Setup position with fen string (!!! without apostrophes and no spaces !!!)
                _, fen = comm.split(' ', 1)     # strip first word
                syslog.info("Command setup position with FEN string")
                syslog.info("FEN: %s" % fen.strip() )
-               pos = parseFEN(fen)
-               color = C.BLACK if fen[0] == 'B' else C.WHITE
-               current = State(pos, color)
-            else:
+               game.post('setup', parseFEN(fen, colorAware=True))
                continue
 
-            lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-            current.pos.mprint(current.color)
-            printSubscript()
-            lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-
          elif comm.startswith('fen'):  # show fen string
             syslog.info("Command show FEN string")
-            fen = current.pos.toFEN(current.color)
-            print("FEN: " + fen)
+            fen = snap.pos.toFEN(snap.color)
+            display.show("FEN: " + fen)
 
          elif comm.startswith('m'):
-            if current.game['started'] == True and \
-                  current.game['myColor'] != current.color:
-               print("Move not allowed; server has to move")
-               continue
-            syslog.info("Command move piece: %s" %comm.strip() )
-            if len(comm.split()) == 1:
-               moves = current.pos.legalMoves()
+            lmove = None
+            if snap.game['started'] == True and \
+                  snap.game['myColor'] != snap.color:
+               display.show("Move not allowed; server has to move")
+            elif len(comm.split()) == 1:
+               syslog.info("Command move piece: %s" %comm.strip() )
+               moves = snap.pos.legalMoves()
                if len(moves) == 1:
                   lmove = moves[0]
                else:
-                  print("Please enter a move like 32-28 or 26x37")
-                  continue
+                  display.show("Please enter a move like 32-28 or 26x37")
             elif len(comm.split()) == 2:
+               syslog.info("Command move piece: %s" %comm.strip() )
                _, umove = comm.split()
                umove = umove.strip()
                match = re.match('(^([0-5]?[0-9][-][0-5]?[0-9])$|^([0-5]?[0-9]([x][0-5]?[0-9])+)$)', umove)
                if match:
-                  steps = moving.mparse_move(current.color, umove)
-                  lmove = current.pos.matchSteps(steps)
-                  if not lmove in current.pos.legalMoves():
-                     print("Illegal move; please enter a legal move")
-                     continue
+                  steps = moving.parse_move(umove)
+                  lmove = snap.pos.matchSteps(steps)
+                  if not lmove in snap.pos.legalMoves():
+                     display.show("Illegal move; please enter a legal move")
+                     lmove = None
                else:
                   # Inform the user when invalid input is entered
-                  print("Please enter a move like 32-28 or 26x37")
-                  continue
+                  display.show("Please enter a move like 32-28 or 26x37")
             else:
-               print("Too many arguments. Enter a move like m 32-28 or m 26x37")
-               continue
+               display.show("Too many arguments. Enter a move like m 32-28 or m 26x37")
 
-            # A legal lmove is found. Now update position and send a message.
-            lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-            if current.game['started'] == True and \
-                  current.game['myColor'] == current.color:
-                  #or True:  # TEST
-               # *** outgoing MOVE message ***
-               timeSpend = 0   # time spend for this move (future)
-
-               # Convert to real, mutual version ("two-color" move)
-               rmove = moving.mreal_move(current.color, lmove) 
-               msg = dxp.msg_move(rmove, timeSpend)
-               ####print('MOVE: ', lmove)
-
-               try:
-                  mySock.send(msg)
-                  dxplog.info("snd MOVE: " + msg)
-               except:
-                  err = sys.exc_info()[1]
-                  print( "Error sending move: %s" % err )
-                  continue
-
-            # Update position and color to move
-            current.pos = current.pos.domove(lmove)
-            current.color = 1-current.color   # alternating: 0 and 1 (White and Black)
-            current.pos.mprint(current.color)
-            printSubscript()
-            lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
+            if lmove is not None:
+               # A legal lmove is found. The GameHandler updates position and sends a message.
+               game.post('move', lmove)
+               continue
 
          elif comm.upper().startswith('H') or comm.startswith('?'):
             syslog.info("Command show help")
-            lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-            # Set lock to prevent printing by incoming messages while printing help
             self.printHelp()
-            lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
 
          elif comm.startswith('conn'):
             # *** connect to remote host ***
             if mySock.sock != None:
-               print("Already connected")
-               continue
-            if current.game['started'] == True:
-               print("Game marked as started. First exit to start a new game.")
-               continue
-            host, port = C.HOST, C.PORT  # default
-            if len(comm.split()) == 2: _, host = comm.split()
-            if len(comm.split()) == 3: _, host,port = comm.split()
-            syslog.info("Command make connection with host %s port %s" %(host, port) )
-            try :
-               mySock.open()
-               mySock.connect(host, int(port))  # with timeout
-               print("Successfully connected to remote host %s, port %s" %(host,port) )
-            except:
-               #mySock.sock.close()
-               mySock.sock = None
-               err = sys.exc_info()[1]
-               print( "Error trying to connect: %s" % err )
-               continue
+               display.show("Already connected")
+            elif snap.game['started'] == True:
+               display.show("Game marked as started. First exit to start a new game.")
+            else:
+               host, port = C.HOST, C.PORT  # default
+               if len(comm.split()) == 2: _, host = comm.split()
+               if len(comm.split()) == 3: _, host,port = comm.split()
+               syslog.info("Command make connection with host %s port %s" %(host, port) )
+               try :
+                  mySock.open()
+                  mySock.connect(host, int(port))  # with timeout
+                  display.show("Successfully connected to remote host %s, port %s" %(host,port) )
+               except:
+                  #mySock.sock.close()
+                  mySock.sock = None
+                  err = sys.exc_info()[1]
+                  display.show( "Error trying to connect: %s" % err )
 
-            if mySock.sock != None:  # connected
-               if not tReceiveHandler.isListening: tReceiveHandler.start()
+               if mySock.sock != None:  # connected
+                  if not tReceiveHandler.isListening: tReceiveHandler.start()
 
          elif comm.startswith('chat'):
             # *** outgoing CHAT message ***
-            if len(comm.split()) == 1:
-               continue
             if len(comm.split()) > 1:
                _, txt = comm.split(' ', 1)  # strip first word
                txt = txt.strip()            # trim whitespace
                syslog.info("Command send chat message: %s" %comm.strip() )
-               msg = dxp.msg_chat(txt)
-               try:
-                  mySock.send(msg)
-                  dxplog.info("snd CHAT: " + msg)
-               except:
-                  err = sys.exc_info()[1]
-                  print( "Error sending chat message: %s" % err )
-                  continue
+               game.post('chat', txt)
+               continue
 
          elif comm.startswith('gamereq'):
             # *** outgoing GAMEREQ message ***
-            if current.game['started'] == True:
-               print("Game already started; gamereq not allowed")
+            if snap.game['started'] == True:
+               display.show("Game already started; gamereq not allowed")
+            else:
+               syslog.info("Command request new game: %s " %comm.strip() )
+               myColor = "W"      # default
+               gameTime = "120"   # default
+               numMoves = "50"    # default
+               if len(comm.split()) == 2: _, myColor = comm.split()
+               if len(comm.split()) == 3: _, myColor, gameTime = comm.split()
+               if len(comm.split()) == 4: _, myColor, gameTime, numMoves = comm.split()
+
+               myColor = C.WHITE if myColor.upper().startswith('W') else C.BLACK
+               game.post('gamereq', myColor, gameTime, numMoves)
                continue
-            syslog.info("Command request new game: %s " %comm.strip() )
-            myColor = "W"      # default
-            gameTime = "120"   # default
-            numMoves = "50"    # default
-            if len(comm.split()) == 2: _, myColor = comm.split()
-            if len(comm.split()) == 3: _, myColor, gameTime = comm.split()
-            if len(comm.split()) == 4: _, myColor, gameTime, numMoves = comm.split()
-
-            myColor = C.WHITE if myColor.upper().startswith('W') else C.BLACK
-            current.game['myColor'] = myColor    # 0 or 1
-            current.game['gameTime'] = gameTime
-            current.game['numMoves'] = numMoves
-            msg = dxp.msg_gamereq(myColor, gameTime, numMoves, current.pos, current.color)
-            try:
-               mySock.send(msg)
-               dxplog.info("snd GAMEREQ: " + msg)
-            except:
-               err = sys.exc_info()[1]
-               print( "Error sending game request: %s" % err )
 
          elif comm.startswith('gameend'):
             # *** outgoing GAMEEND message ***
-            if current.game['started'] == False:
-               print("Game already finished; gameend not allowed")
-               continue
-            syslog.info("Command finish game: %s " %comm.strip() )
-            if current.game['started'] == True and \
-                  current.game['myColor'] != current.color:
-               print("Message gameend not allowed; wait until your turn")
-               continue
-            if len(comm.split()) == 2:
-                _, reason = comm.split()
+            if snap.game['started'] == False:
+               display.show("Game already finished; gameend not allowed")
+            elif snap.game['myColor'] != snap.color:
+               display.show("Message gameend not allowed; wait until your turn")
             else:
-                reason = "0"
-            msg = dxp.msg_gameend(reason)
-
-            try:
-               mySock.send(msg)
-               dxplog.info("snd GAMEEND: " + msg)
-               current.game['started'] == False   # stop game
-               current.game['result'] == reason
-            except:
-               err = sys.exc_info()[1]
-               print( "Error sending gameend message: %s" % err )
+               syslog.info("Command finish game: %s " %comm.strip() )
+               if len(comm.split()) == 2:
+                   _, reason = comm.split()
+               else:
+                   reason = "0"
+               game.post('gameend', reason)
+               continue
 
          elif comm.startswith('backreq'):
             # *** outgoing BACKREQ message ***
-            if current.game['started'] == False:
-               print("Game not started; backreq not allowed")
-               continue
-            print("Not yet supported")
+            if snap.game['started'] == False:
+               display.show("Game not started; backreq not allowed")
+            else:
+               display.show("Not yet supported")
 
          elif comm.startswith('clear'):
             syslog.info("Command clear logfiles: %s" %comm.strip() )
             clearLogFiles()
-            print("Log files %s and %s cleared " % (C.SYSLOG_FILE, C.DXPLOG_FILE ) )
+            display.show("Log files %s and %s cleared " % (C.SYSLOG_FILE, C.DXPLOG_FILE ) )
             syslog.info("Log files %s and %s cleared " % (C.SYSLOG_FILE, C.DXPLOG_FILE ) )
 
+         elif comm.startswith('logstat'):
+            # Statistics of the queue of log records
+            if logQueue is None:
+               display.show("Log files are written synchronously (C.LOG_ASYNC is False)")
+            else:
+               display.show("Log queue: " + logQueue.stats())
+
+         elif comm.startswith('stats'):
+            # Timing statistics: stats [clear | dump [file]]
+            args = comm.split()
+            syslog.info("Command timing statistics: %s" %comm.strip() )
+            game.post('stats', *args[1:3])
+            continue
+
          elif comm.startswith('pieceset'):
             C.PIECE_CHARSET = 1 - C.PIECE_CHARSET    # toggle pieceset
             syslog.info("Command toggle pieceset to: " + str(['Unicode', 'ASCII'][C.PIECE_CHARSET]) )
-            lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-            current.pos.mprint(current.color)
-            printSubscript()
-            lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-            print("new pieceset: " + str(['Unicode', 'ASCII'][C.PIECE_CHARSET]))
+            display.board(snap)
+            display.show("new pieceset: " + str(['Unicode', 'ASCII'][C.PIECE_CHARSET]))
+
+         elif comm.startswith('backend'):
+            # Show or select move generator backend
+            if len(comm.split()) == 2:
+               _, name = comm.split()
+               try:
+                  dxc100_moves.set_backend(name)
+                  syslog.info("Command select move generator: " + name)
+               except:
+                  err = sys.exc_info()[1]
+                  display.show( "Error selecting move generator: %s" % err )
+            display.show("Move generator: " + dxc100_moves.backend)
+
+         elif comm.startswith('perft'):
+            # Perft of current position: count nodes of game tree up to depth
+            args = comm.split()
+            if len(args) < 2 or not args[1].isdigit():
+               display.show("Please enter a depth like: perft 5  or  perft 5 divide")
+            else:
+               syslog.info("Command perft: %s" %comm.strip() )
+               fen = snap.pos.toFEN(snap.color)
+               out = StringIO.StringIO()
+               dxc100_perft.runPerft(fen, int(args[1]), len(args) > 2 and args[2].startswith('d'), out, colorAware=True)
+               display.show(out.getvalue().rstrip('\n'))
+
+         elif comm.startswith('solve'):
+            # Problem solver: search a forced win for the player to move of current position
+            args = comm.split()
+            if len(args) < 2 or not all( a.isdigit() for a in args[1:3] ):
+               display.show("Please enter a depth in moves like: solve 5  or with max nodes: solve 10 300000")
+            else:
+               syslog.info("Command solve: %s" %comm.strip() )
+               fen = snap.pos.toFEN(snap.color)
+               out = StringIO.StringIO()
+               dxc100_solve.runSolve(fen, int(args[1]), out, int(args[2]) if len(args) > 2 else 0)
+               display.show(out.getvalue().rstrip('\n'))
+
+         elif comm.startswith('book'):
+            # Opening book: show book moves of current position; play the most played one; open a book
+            args = comm.split()
+            syslog.info("Command book: %s" %comm.strip() )
+            if len(args) == 3 and args[1] == 'open':
+               try:
+                  newBook = OpeningBook(args[2])
+                  if book is not None: book.close()
+                  book = newBook
+               except:
+                  display.show( "Error opening book: %s" % sys.exc_info()[1] )
+            if book is None:
+               display.show("No opening book; enter: book open <file>")
+            elif len(args) == 2 and args[1] == 'play':
+               lmove = book.choose(snap.pos)
+               if snap.game['started'] == True and snap.game['myColor'] != snap.color:
+                  display.show("Move not allowed; server has to move")
+               elif lmove is None:
+                  display.show("Position not in opening book")
+               else:
+                  game.post('move', lmove)
+                  continue
+            else:
+               bmoves = book.moves(snap.pos)
+               display.show(book.stats())
+               display.show("Book moves: " + ('  '.join( "%s (%d)" % (moving.render_move(m), n) for m, n in bmoves )
+                                             if bmoves else 'none'))
+
+         elif comm.startswith('cache'):
+            # Show statistics of the cache of legal moves; 'cache clear' empties it
+            if len(comm.split()) == 2 and comm.split()[1] == 'clear':
+               moveCache.clear()
+               syslog.info("Command clear move cache")
+            display.show("Move cache: " + moveCache.stats())
 
          elif comm.startswith('test0'):
             # TEST TEST TEST
             syslog.info("Command test: %s" %comm.strip() )
             t0 = time.time()
             for i in range(1,100):
-               legalMoves = current.pos.legalMoves()
+               legalMoves = gen_moves(snap.pos)   # not cached: test the move generator
             t1 = time.time()
 
-            current.pos.mprint(current.color)
+            display.board(snap)
 
-            print("Time elapsed for test: " + str(t1 - t0)  )
+            display.show("Time elapsed for test: " + str(t1 - t0)  )
+            display.show("Memory of position object: %d bytes" % snap.pos.sizeof() )
 
          elif comm.startswith('test1'):
             # *** test1 ***
             syslog.info("Command test: %s" %comm.strip() )
- 
+
             alert.info("Alert > TEST MESSAGE")
             syslog.info("Sys > TEST MESSAGE")
             dxplog.info("Dxp > TEST MESSAGE")
 
-            print("My Color: " + str(['white', 'black'][current.game['myColor']]) )
-            print("Color to move: " + str(['white', 'black'][current.color]) )
+            display.show("My Color: " + str(['white', 'black'][snap.game['myColor']]) )
+            display.show("Color to move: " + str(['white', 'black'][snap.color]) )
 
-            msg = "Hello World"
-            try:
-               mySock.send(msg)
-               print("snd TEST: " + msg)
-            except:
-               err = sys.exc_info()[1]
-               print( "Error %s" % err )
+            game.post('send', "Hello World", "TEST")
+            continue
 
          elif comm.startswith('test2'):
             # TEST TEST TEST
-            msg = dxp.msg_backreq(1, C.WHITE)
-            mySock.send(msg)
-            print("snd TEST BACKREQ: " + msg)
+            game.post('send', dxp.msg_backreq(1, C.WHITE), "TEST BACKREQ")
+            continue
 
          #===================================================================================
          else:
             syslog.info("Command unknown: %s" %comm.strip() )
-            print("Unknown command, type h for help: %s" %comm.strip() )
+            display.show("Unknown command, type h for help: %s" %comm.strip() )
             ### stack.append('H')
 
+         display.prompt()   # command done; commands posted to the GameHandler prompt when handled
+
       # end while console input
 
-      print("ConsoleHandler stopped")
-      print("Save your data and exit program to start again. ")
+      display.show("ConsoleHandler stopped")
+      display.show("Save your data and exit program to start again. ")
       return None
    # def run(self)
 
    def printHelp(self):
-      print(' ___________________________________________________________________  ')
-      print('| Use one of these commands:  ')
-      print('|  ')
-      print('| q:           quit  ')
-      print('| h:           this help info  ')
-      print('| setup:       setup starting position  ')
-      print('| setup <fen>: setup position with given fen-string  ')
-      print('| fen:         show fen string ')
-      print('| legal:       show legal moves  ')
-      print('| clear:       clear log files ')
-      print('| pieceset:    toggle between ASCII and Unicode pieceset ')
-      print('|  ')
-      print('| m <move>:    do move (format: 32-28, 16x27, etc)  ')
-      print('| m:           do move (if only one move possible)  ')
-      print('|  ')
-      print('| connect <host> <port>:  ')
-      print('|              connect to server  ')
-      print('|              default localhost and port 27531  ')
-      print('| chat <msg>:  send chat message to server  ')
-      print('| gamereq <myColor> <gameTime> <numMoves>:  ')
-      print('|              send game request to server with myColor W or B ')
-      print('|              parameters optional with defaults: ')
-      print('|              myColor: W,  gameTime: 120,  numMoves: 50 ')
-      print('| gameend <reason>: ')
-      print('|              send game end with reason ')
-      print('|              0: unknown  1: I lose  2: draw  3: I win ')
-      print('| backreq <moveId> <color>:  ')
-      print('|              send request to move back ')
-      print('|              not yet supported ')
-      print('|  ')
-      print('|___________________________________________________________________  ')
-      #print()
+      display.show('\n'.join([
+      ' ___________________________________________________________________  ',
+      '| Use one of these commands:  ',
+      '|  ',
+      '| q:           quit  ',
+      '| h:           this help info  ',
+      '| setup:       setup starting position  ',
+      '| setup <fen>: setup position with given fen-string  ',
+      '| fen:         show fen string ',
+      '| legal:       show legal moves  ',
+      '| clear:       clear log files ',
+      '| logstat:     show statistics of the log queue ',
+      '| stats [clear | dump [file]]: ',
+      '|              show timing of messages and game clock ',
+      '|              dump: as JSON to the screen or to a file ',
+      '| pieceset:    toggle between ASCII and Unicode pieceset ',
+      '| backend <name>: select move generator: list or bitboard ',
+      '| perft <depth> [divide]: count nodes of game tree of position ',
+      '| solve <depth> [nodes]: search forced win of player to move ',
+      '|              within depth moves; optional max nodes ',
+      '| cache [clear]: show statistics of cache of legal moves ',
+      '| book [play | open <file>]: show moves of opening book ',
+      '|              play: do the most played book move ',
+      '|  ',
+      '| m <move>:    do move (format: 32-28, 16x27, etc)  ',
+      '| m:           do move (if only one move possible)  ',
+      '|  ',
+      '| connect <host> <port>:  ',
+      '|              connect to server  ',
+      '|              default localhost and port 27531  ',
+      '| chat <msg>:  send chat message to server  ',
+      '| gamereq <myColor> <gameTime> <numMoves>:  ',
+      '|              send game request to server with myColor W or B ',
+      '|              parameters optional with defaults: ',
+      '|              myColor: W,  gameTime: 120,  numMoves: 50 ',
+      '| gameend <reason>: ',
+      '|              send game end with reason ',
+      '|              0: unknown  1: I lose  2: draw  3: I win ',
+      '| backreq <moveId> <color>:  ',
+      '|              send request to move back ',
+      '|              not yet supported ',
+      '|  ',
+      '|___________________________________________________________________  ',
+      ]))
       return None
    # def printHelp(self)
 
@@ -437,6 +772,7 @@ class ConsoleHandler(threading.Thread):
 
 class ReceiveHandler(threading.Thread):
    # Subslass of Thread to handle incoming messages from client.
+   # Messages are posted to the GameHandler; no waiting for state or terminal.
 
    def __init__(self):
       threading.Thread.__init__(self)
@@ -447,7 +783,7 @@ class ReceiveHandler(threading.Thread):
       # Excutes when thread started. Overriding python threading.Thread.run()
 
       syslog.info("ReceiveHandler started")
-      global current, mySock, lock
+      global mySock
       self.isListening = True
       dxplog.info("%s starts listening" % C.INITIATOR)
       while True:
@@ -455,100 +791,17 @@ class ReceiveHandler(threading.Thread):
             message = mySock.receive()   # wait for message
          except:
             err = sys.exc_info()[1]
-            print( "Error %s" % err )
+            display.show( "Error %s" % err )
             break
-
-         lock.acquire()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
-         message = message[0:127]  # DXP max length
-         dxpData = dxp.parse(message)
-         if dxpData["type"] == "C":
-            dxplog.info("rcv CHAT: " + message)
-            print("\nChat message: " + dxpData["text"])
-            prompt()
-
-         elif dxpData["type"] == "A":
-            dxplog.info("rcv GAMEACC: " + message)
-            if dxpData["accCode"] == "0":
-               current.game['started'] = True
-               current.game['myColor'] = current.game['myColor']  # as requested
-               current.game['engineName'] = dxpData["engineName"]
-               current.game['startingTime'] = "YYY"   # TODO
-               print("\nGame request accepted by " + dxpData["engineName"])
-            else:
-               current.game['started'] = False
-               print("\nGame request NOT accepted by " + dxpData["engineName"] + " Reason: " + dxpData["accCode"])
-            current.pos.mprint(current.color)
-            printSubscript()
-            prompt()
-
-         elif dxpData["type"] == "E":
-            dxplog.info("rcv GAMEEND: " + message)
-            print("\nRequest end of game accepted. Reason: " + dxpData["reason"] + " Stop: " + dxpData["stop"])
-            prompt()
-            # Confirm game end by sending message back (if not sent by me)
-            if current.game['started'] == True:
-               current.game['started'] = False
-               current.game['result'] = dxpData["reason"]
-               msg = dxp.msg_gameend(dxpData["reason"])
-               mySock.send(msg)
-               dxplog.info("snd GAMEEND: " + msg)
-
-         elif dxpData["type"] == "M":
-            dxplog.info("rcv MOVE: " + message)
-            steps = [ dxpData['from'], dxpData['to'] ]
-            nsteps = map( int, steps )
-            ntakes = map( int, dxpData['captures'] )
-            rmove_dxp = Move(nsteps, ntakes)   # namedtuple, a real move from host
-            ##color_text = str(['white', 'black'][current.color])
-            ##print("Received move: " + str(rmove_dxp) + " with color " + color_text )
-            move_dxp = moving.mreal_move(current.color, rmove_dxp)  # the "one-color" dxp move
-            xmove = current.pos.matchStepsAndTakes(move_dxp.steps, move_dxp.takes) # the "one-color" system move
-
-            if xmove != None:
-               # Update position and color to move
-               ##print("Received xmove: " + str(xmove))
-               print("\nMove received: " + moving.mrender_move(current.color, xmove) )
-               current.pos = current.pos.domove(xmove)
-               current.color = 1-current.color   # alternating: 0 and 1 (White and Black)
-               current.pos.mprint(current.color)
-               printSubscript()
-               prompt()
-            else:
-               print("Error: received move is illegal [" + message + "]")
-               prompt()
-
-         elif dxpData["type"] == "B":
-            # For the time being do not confirm request from server: send message back.
-            dxplog.info("rcv BACKREQ: " + message)
-            accCode = "1"   # 0: BACK YES; 1: BACK NO; 2: CONTINUE
-            msg = dxp.msg_backacc(accCode)
-            mySock.send(msg)
-            dxplog.info("snd BACKACC: " + msg)
-
-         elif dxpData["type"] == "K":
-            # Answer to my request to move back
-            dxplog.info("rcv BACKACC: " + message)
-            print("rcv BACKACC: " + message)   # TEST
-            accCode = dxpData['accCode']
-            if accCode == "0":
-               # Actions to go back in history as specified in my request
-               print("TODO: actions to move back")
-               pass   # TODO
-
-         else:
-            dxplog.info("rcv UNKNOWN: " + message)
-            print("\nrcv Unknown message: " + message)
-            prompt()
-
-         lock.release()   # LOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCKLOCK
+         game.post('message', message)
 
       # end while listening
 
       self.isListening = False
       dxplog.error("Listening stopped; connection broken")
-      print("Connection broken; receiveHandler stopped. ")
-      print("Save your data and exit program to start again. ")
-      prompt()
+      display.show("Connection broken; receiveHandler stopped. ")
+      display.show("Save your data and exit program to start again. ")
+      display.prompt()
       return None
    # def run(self)
 
@@ -562,13 +815,24 @@ if __name__ == '__main__':
    dxp = DamExchange()     # global, singleton
    moving = Moving()       # global, singleton
    mySock = MySocket()     # global, singleton
-   current = State(Position(C.BOARD_START), C.WHITE)  # global; use default parms
-   lock = threading.Lock() # global
-   initLogging()           # globals: syslog, dxplog, alert
-
-   # use 2 threads to simultaneous listen to incoming messages and to console input
+   current = State(ColorPosition(C.BOARD_START, C.WHITE), C.WHITE)  # global; only changed by GameHandler
+   view = current.snapshot()   # global; snapshot of current, replaced after each event
+   timing = TimingStats()  # global; durations of the stages of messages and commands
+   book = None             # global; opening book (C.BOOK_FILE or command book open)
+   if C.BOOK_FILE:
+      try:
+         book = OpeningBook(C.BOOK_FILE)
+      except:
+         print("Opening book not opened: %s" % sys.exc_info()[1])
+   initLogging()           # globals: syslog, dxplog, alert, gamelog, logQueue, logListener
+
+   # Threads: console input, incoming messages, game state (single writer) and terminal output
+   display = DisplayHandler()           # global; Thread subclass instance
+   game = GameHandler()                 # global; Thread subclass instance
    tConsoleHandler = ConsoleHandler()   # Thread subclass instance
    tReceiveHandler = ReceiveHandler()   # Thread subclass instance. Start when connected.
+   display.start()
+   game.start()
    tConsoleHandler.start()
 
 # endif
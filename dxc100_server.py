@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Local DXP server for load and latency tests of the client
+| Remember:
+| - The server is a FOLLOWER: it accepts GAMEREQ, answers GAMEACC and plays
+|   legal moves (gen_moves) at random or from a script, after a set delay.
+| - Optional noise: CHAT and BACKREQ messages between the moves.
+| - All connections are handled by one thread with an asyncore event loop
+|   (poll, not select: no limit of 1024 connections).
+| - The server has no intelligence; it is a stand-in for a real engine.
+| Usage:
+| - python dxc100_server.py [host] [port] [--delay SEC] [--script MOVES] [--chat P] [--backreq P]
+|                           [--max-games N]
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, socket, asyncore, random, time, heapq, logging
+import argparse
+import dxc100_config as C
+from dxc100_classes import Moving, MsgBuffer
+from dxc100_dxp import DxpCodec
+from dxc100_position import ColorPosition, dxpPosition
+
+dxp = DxpCodec()
+moving = Moving()
+dxplog = logging.getLogger('DXP')
+dxplog.addHandler(logging.NullHandler())   # no warning if logging is not configured
+
+SERVERNAME = "DXC100 stand-in server"
+
+class ServerSession(asyncore.dispatcher):
+   # One connection with a client; the client is the initiator of the games
+
+   def __init__(self, sock, server):
+      asyncore.dispatcher.__init__(self, sock, map=server.sockmap)
+      self.server = server
+      self.inbuf = MsgBuffer()
+      self.outbuf = ""
+      self.pos = None
+      self.myColor = None
+      self.ply = 0          # number of moves of the server in this game
+      self.turnTime = None  # time our turn started
+      self.playing = False
+
+   def send_msg(self, msg):
+      self.outbuf += msg + "\0"
+      self.server.msgsOut += 1
+      return None
+
+   def writable(self):
+      return len(self.outbuf) > 0
+
+   def handle_write(self):
+      sent = self.send(self.outbuf)
+      self.outbuf = self.outbuf[sent:]
+
+   def handle_read(self):
+      chunk = self.recv(4096)
+      if not chunk: return None
+      self.inbuf.feed(chunk)
+      for message in self.inbuf.messages():
+         message = message.strip()
+         if message:
+            self.server.msgsIn += 1
+            self.handle_message(message[0:127])
+      return None
+
+   def handle_message(self, message):
+      dxpData = dxp.parse(message)
+      mtype = dxpData["type"]
+      if mtype == "R":
+         self.myColor = C.WHITE if dxpData['fColor'] == 'W' else C.BLACK
+         if dxpData['posInd'] == 'A':
+            self.pos = ColorPosition(C.BOARD_START, C.WHITE)
+         else:
+            try:
+               self.pos = dxpPosition(dxpData['pos'], dxpData['mColor'])
+            except:
+               self.send_msg(dxp.msg_gameacc(SERVERNAME, 3))   # not accepted: position
+               return None
+         self.send_msg(dxp.msg_gameacc(SERVERNAME, 0))
+         self.playing = True
+         self.ply = 0
+         self.server.gamesStarted += 1
+         self.schedulePlay()
+
+      elif mtype == "M":
+         if not self.playing or self.pos.color == self.myColor:
+            return None
+         steps = [ int(dxpData['from']), int(dxpData['to']) ]
+         move = self.pos.matchStepsAndTakes(steps, map(int, dxpData['captures']))
+         if move is None:
+            dxplog.error("stand-in server: illegal move received: %s" % message)
+            self.endGame(3)    # I win: adjudicated like the session does
+            return None
+         self.pos = self.pos.domove(move)
+         self.schedulePlay()
+
+      elif mtype == "E":
+         if self.playing:
+            self.send_msg(dxp.msg_gameend(dxpData['reason']))   # confirm game end
+         self.playing = False
+         self.server.gameFinished()
+
+      return None
+   # def handle_message()
+
+   def schedulePlay(self):
+      # Our move after the delay (if it is our turn)
+      if not self.playing or self.pos.color != self.myColor: return None
+      self.turnTime = time.time()
+      if self.server.delay > 0:
+         self.server.schedule(self.server.delay, self.play)
+      else:
+         self.play()
+      return None
+
+   def play(self):
+      if not self.playing or self.pos.color != self.myColor or not self.connected: return None
+      moves = self.pos.legalMoves()
+      if not moves:
+         self.endGame(1)    # I lose
+         return None
+      move = self.server.chooseMove(self.ply, moves)
+      self.sendNoise()
+      self.send_msg(dxp.msg_move(move, int(round(time.time() - self.turnTime))))    # time spent in seconds
+      self.pos = self.pos.domove(move)
+      self.ply += 1
+      return None
+
+   def sendNoise(self):
+      if random.random() < self.server.chatRate:
+         self.send_msg(dxp.msg_chat("noise %d" % self.ply))
+      if random.random() < self.server.backreqRate:
+         self.send_msg(dxp.msg_backreq(self.ply, self.myColor))
+      return None
+
+   def endGame(self, reason):
+      self.send_msg(dxp.msg_gameend(reason))
+      self.playing = False
+      return None
+
+   def handle_close(self):
+      self.close()
+      if self.playing:
+         self.playing = False
+         self.server.gameFinished()
+
+   def handle_error(self):
+      dxplog.error("stand-in server: %s" % sys.exc_info()[1])
+      self.handle_close()
+
+# *** END class ServerSession ***
+
+
+class StandInServer(asyncore.dispatcher):
+   # Listening socket and event loop of the stand-in server
+
+   def __init__(self, host=C.HOST, port=C.PORT, delay=0.0, script=None, chatRate=0.0,
+                backreqRate=0.0, maxGames=None):
+      self.sockmap = {}
+      asyncore.dispatcher.__init__(self, map=self.sockmap)
+      self.delay = delay              # seconds before each move
+      self.script = script or []      # moves of the server in user format; random if not legal
+      self.chatRate = chatRate        # probability of a CHAT before a move
+      self.backreqRate = backreqRate  # probability of a BACKREQ before a move
+      self.maxGames = maxGames        # stop after this number of finished games (None: never)
+      self.timers = []                # heap of (time, seq, function)
+      self.seq = 0
+      self.gamesStarted = self.gamesFinished = 0
+      self.msgsIn = self.msgsOut = 0
+      self.connections = 0
+      self.running = False
+      self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+      self.set_reuse_addr()
+      self.bind((host, port))
+      self.listen(1024)
+      self.address = self.socket.getsockname()
+
+   def handle_accept(self):
+      pair = self.accept()
+      if pair is None: return None
+      self.connections += 1
+      ServerSession(pair[0], self)
+
+   def chooseMove(self, ply, moves):
+      # Scripted move if available and legal, else a random move
+      if ply < len(self.script):
+         for move in moves:
+            if moving.render_move(move) == self.script[ply]: return move
+      return random.choice(moves)
+
+   def schedule(self, delay, func):
+      self.seq += 1
+      heapq.heappush(self.timers, (time.time() + delay, self.seq, func))
+
+   def gameFinished(self):
+      self.gamesFinished += 1
+      if self.maxGames is not None and self.gamesFinished >= self.maxGames:
+         self.running = False
+
+   def serve(self):
+      # Event loop; runs until stop() or maxGames finished
+      self.running = True
+      while self.running:
+         timeout = 1.0
+         if self.timers: timeout = max(0.0, min(timeout, self.timers[0][0] - time.time()))
+         asyncore.loop(timeout=timeout, map=self.sockmap, count=1, use_poll=True)
+         now = time.time()
+         while self.timers and self.timers[0][0] <= now:
+            heapq.heappop(self.timers)[2]()
+      self.flush()
+      return None
+
+   def flush(self):
+      # Send what is left in the output buffers
+      for s in self.sockmap.values():
+         if s is not self and s.outbuf:
+            try:
+               s.handle_write()
+            except socket.error:
+               pass
+      return None
+
+   def stop(self):
+      self.running = False
+
+   def stats(self):
+      return "connections %d  games %d/%d  messages in %d  out %d" % \
+             (self.connections, self.gamesFinished, self.gamesStarted, self.msgsIn, self.msgsOut)
+
+# *** END class StandInServer ***
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Local DXP stand-in server for tests of the client')
+   parser.add_argument('host', nargs='?', default=C.HOST)
+   parser.add_argument('port', nargs='?', type=int, default=C.PORT)
+   parser.add_argument('--delay', type=float, default=0.0, help='seconds before each move')
+   parser.add_argument('--script', default='', help='moves of the server, like 19-23,14-19')
+   parser.add_argument('--chat', type=float, default=0.0, metavar='P', help='probability of a CHAT per move')
+   parser.add_argument('--backreq', type=float, default=0.0, metavar='P', help='probability of a BACKREQ per move')
+   parser.add_argument('--max-games', type=int, help='stop after N finished games')
+   args = parser.parse_args()
+
+   script = [ m.strip() for m in args.script.split(',') if m.strip() ]
+   server = StandInServer(args.host, args.port, args.delay, script, args.chat, args.backreq, args.max_games)
+   print("%s listening on %s:%s" % (SERVERNAME, server.address[0], server.address[1]))
+   try:
+      server.serve()
+   except KeyboardInterrupt:
+      pass
+   print(server.stats())
+   return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: DXP game sessions in one event loop
+| Remember:
+| - A session is one game with a DXP server over its own socket connection.
+| - All sessions run in one thread with an asyncore event loop (poll); no locks needed.
+|   Each session has its own position and game state, so many games can be
+|   played simultaneously from one process.
+| - Messages are NUL-terminated; a receive buffer is kept per session, so
+|   messages that arrive together or in parts are handled one by one.
+| - The moves of our side are chosen by a player: a function with a
+|   colour-aware position as parameter returning a legal move (or None to resign).
+| Usage:
+|    session = DxpSession(host, port, C.WHITE, randomPlayer, sockmap=sessions)
+|    runSessions(sessions)
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, asyncore, socket, random, time, logging
+import dxc100_config as C
+from dxc100_classes import Moving, MsgBuffer
+from dxc100_dxp import DxpCodec
+from dxc100_position import ColorPosition, parseFEN
+from dxc100_gamelog import SND, RCV
+
+dxp = DxpCodec()
+moving = Moving()
+dxplog = logging.getLogger('DXP')
+dxplog.addHandler(logging.NullHandler())   # no warning if logging is not configured
+
+def firstPlayer(pos):     # PUBLIC
+   # Player that always plays the first legal move
+   moves = pos.legalMoves()
+   return moves[0] if moves else None
+
+def randomPlayer(pos):     # PUBLIC
+   # Player that plays a random legal move
+   moves = pos.legalMoves()
+   return random.choice(moves) if moves else None
+
+
+class DxpSession(asyncore.dispatcher):
+   # One DXP game over a socket connection; we are the initiator (client).
+   # State: 'connecting', 'requested', 'playing', 'ending' (our GAMEEND sent), 'finished'
+   # Attributes after the game: result (DXP reason code of the game end,
+   # seen from us: 0 unknown, 1 I lose, 2 draw, 3 I win), moves (list of
+   # rendered moves), error (text or None), latencies (seconds between our
+   # move, or the game start, and the move of the server).
+   #
+
+   def __init__(self, host, port, myColor, player, gameTime=120, numMoves=50,
+                fen=None, maxPlies=None, name=None, sockmap=None, gamelog=None, gameId=0):
+      asyncore.dispatcher.__init__(self, map=sockmap)
+      self.name = name or "%s:%s" % (host, port)
+      self.myColor = myColor
+      self.player = player
+      self.gameTime = gameTime
+      self.numMoves = numMoves
+      self.fen = fen
+      self.maxPlies = maxPlies   # propose draw after this number of plies (None: no limit)
+      if fen is None:
+         self.pos = ColorPosition(C.BOARD_START, C.WHITE)
+      else:
+         self.pos = parseFEN(fen, colorAware=True)
+      self.state = 'connecting'
+      self.engineName = None
+      self.result = None
+      self.error = None
+      self.moves = []
+      self.inbuf = MsgBuffer()
+      self.outbuf = ""
+      self.startTime = None
+      self.endTime = None
+      self.endReason = None
+      self.latencies = []
+      self.waitTime = None    # time we started waiting for a move of the server
+      self.gamelog = gamelog  # GameLogWriter (dxc100_gamelog) or None
+      self.gameId = gameId    # game number in the game log
+      self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+      self.connect((host, int(port)))
+
+   # *** Sending ***
+
+   def send_msg(self, msg, mtype):
+      self.outbuf += msg + "\0"
+      dxplog.info("%s snd %s: %s" % (self.name, mtype, msg))
+      if self.gamelog is not None: self.gamelog.log(self.gameId, SND, msg)
+      return None
+
+   def writable(self):
+      return len(self.outbuf) > 0 or self.state == 'connecting'
+
+   def handle_write(self):
+      sent = self.send(self.outbuf)
+      self.outbuf = self.outbuf[sent:]
+
+   # *** Receiving ***
+
+   def handle_connect(self):
+      self.state = 'requested'
+      self.startTime = time.time()
+      if self.fen is None:
+         msg = dxp.msg_gamereq(self.myColor, self.gameTime, self.numMoves)
+      else:
+         msg = dxp.msg_gamereq(self.myColor, self.gameTime, self.numMoves, self.pos, self.pos.color)
+      self.send_msg(msg, "GAMEREQ")
+
+   def handle_read(self):
+      chunk = self.recv(4096)
+      if not chunk: return None      # closed; handle_close follows
+      self.inbuf.feed(chunk)
+      for message in self.inbuf.messages():
+         message = message.strip()
+         if message: self.handle_message(message[0:127])   # DXP max length
+         if self.state == 'finished': break
+      return None
+
+   def handle_message(self, message):
+      # Handle one incoming DXP message
+      if self.gamelog is not None: self.gamelog.log(self.gameId, RCV, message)
+      dxpData = dxp.parse(message)
+      mtype = dxpData["type"]
+      if mtype == "A":
+         dxplog.info("%s rcv GAMEACC: %s" % (self.name, message))
+         self.engineName = dxpData["engineName"]
+         if dxpData["accCode"] != "0":
+            self.finish(None, "game request not accepted: %s" % dxpData["accCode"])
+            return None
+         self.state = 'playing'
+         self.waitTime = time.time()
+         self.play()
+
+      elif mtype == "M":
+         dxplog.info("%s rcv MOVE: %s" % (self.name, message))
+         if self.waitTime is not None: self.latencies.append(time.time() - self.waitTime)
+         if self.state != 'playing' or self.pos.color == self.myColor:
+            self.finish(None, "move out of turn: %s" % message)
+            return None
+         steps = [ int(dxpData['from']), int(dxpData['to']) ]
+         move = self.pos.matchStepsAndTakes(steps, map(int, dxpData['captures']))
+         if move is None:
+            self.finish('3', "illegal move received: %s" % message)   # adjudicated: I win
+            return None
+         self.domove(move)
+         self.play()
+
+      elif mtype == "E":
+         dxplog.info("%s rcv GAMEEND: %s" % (self.name, message))
+         if self.state == 'ending':
+            self.finish(self.endReason)      # confirmation of our game end
+            return None
+         # Reason is seen from the server: its loss is our win and vice versa
+         reason = dxpData["reason"]
+         self.send_msg(dxp.msg_gameend(reason), "GAMEEND")    # confirm game end
+         self.finish({'1': '3', '3': '1'}.get(reason, reason))
+
+      elif mtype == "C":
+         dxplog.info("%s rcv CHAT: %s" % (self.name, message))
+
+      elif mtype == "B":
+         dxplog.info("%s rcv BACKREQ: %s" % (self.name, message))
+         self.send_msg(dxp.msg_backacc("1"), "BACKACC")    # not supported
+
+      else:
+         dxplog.info("%s rcv UNKNOWN: %s" % (self.name, message))
+      return None
+   # def handle_message()
+
+   # *** Game ***
+
+   def domove(self, move):
+      self.moves.append(moving.render_move(move))
+      self.pos = self.pos.domove(move)
+
+   def play(self):
+      # Our move if it is our turn
+      if self.state != 'playing' or self.pos.color != self.myColor: return None
+      t0 = time.time()
+      if self.maxPlies is not None and len(self.moves) >= self.maxPlies:
+         return self.endGame('2')    # draw
+      move = self.player(self.pos)
+      if move is None:
+         return self.endGame('1')    # I lose
+      self.send_msg(dxp.msg_move(move, int(round(time.time() - t0))), "MOVE")    # time spent in seconds
+      self.domove(move)
+      self.waitTime = time.time()
+      return None
+
+   def endGame(self, reason):
+      # Send GAMEEND; the game is finished when the server confirms
+      self.endReason = reason
+      self.send_msg(dxp.msg_gameend(reason), "GAMEEND")
+      self.state = 'ending'
+      return None
+
+   def finish(self, result, error=None):
+      self.result = result
+      self.error = error
+      self.state = 'finished'
+      self.endTime = time.time()
+      if error is not None: dxplog.error("%s %s" % (self.name, error))
+      self.flush()
+      self.close()
+      return None
+
+   def flush(self):
+      # Send what is left in the output buffer before closing
+      try:
+         while self.outbuf:
+            sent = self.send(self.outbuf)
+            if not sent: break
+            self.outbuf = self.outbuf[sent:]
+      except socket.error:
+         pass
+      return None
+
+   def handle_close(self):
+      if self.state != 'finished':
+         self.finish(self.result, "connection closed by server")
+      else:
+         self.close()
+
+   def handle_error(self):
+      err = sys.exc_info()[1]
+      if self.state != 'finished': self.finish(None, "error: %s" % err)
+
+# *** END class DxpSession ***
+
+
+def runSessions(sockmap, timeout=1.0):     # PUBLIC
+   # Run the event loop until all sessions of sockmap are finished
+   while sockmap:
+      asyncore.loop(timeout=timeout, map=sockmap, count=1, use_poll=True)
+   return None
+# end runSessions
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Problem solver; search for a forced win of the player to move
+| Remember:
+| - The player to move (attacker) wins if the opponent (defender) has no
+|   legal move: all pieces captured or blocked. There is no evaluation.
+| - Depth is the number of moves of the attacker; depth N is a search of
+|   2N-1 plies. Iterative deepening: depth 1, 2, ... until a win is found.
+| - Transposition table (dxc100_ttable) with per position the plies searched,
+|   the plies of a proven win (0: no win) and the index of the best move.
+|   The table is kept between iterations.
+| - Move ordering: the move of the table first; attacker moves that leave
+|   the fewest replies (like sacrifices forcing a capture) before the others.
+| - Legal moves come from Position.legalMoves (cached), positions from domove.
+| Usage:
+| - python dxc100_solve.py <fen or name> <depth> [--nodes N] [--hash MB]
+| Name is a FEN constant of dxc100_config, like FEN_DXP100_1.
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import sys, time
+import argparse
+import dxc100_config as C
+from dxc100_position import parseFEN
+from dxc100_perft import lookupFEN
+from dxc100_classes import Moving
+from dxc100_ttable import TranspositionTable, NOMOVE
+
+class NodeLimit(Exception):
+   # Search stopped: max number of nodes reached
+   pass
+
+
+class Solver:
+   # Forced-win search with a transposition table; see module doc.
+   # attack() and defend() return the number of plies of the win, or 0 if no win found.
+   #
+
+   def __init__(self, sizeMB=C.TT_SIZE_MB, maxNodes=0):
+      self.maxNodes = maxNodes    # 0: no limit
+      self.tt = TranspositionTable(sizeMB)
+      self.nodes = 0
+
+   def probe(self, zkey, plies):
+      # Returns (result, move index): result is plies of win, 0 (no win) or None (unknown)
+      entry = self.tt.get(zkey)
+      if entry is None: return None, NOMOVE
+      searched, win, _, k = entry
+      if win and win <= plies: return win, k
+      if not win and searched >= plies: return 0, k
+      return None, k
+
+   def store(self, zkey, plies, win, k=NOMOVE):
+      # Remember the result of a search with plies; win is plies of win or 0, k the index of the best move
+      self.tt.put(zkey, plies, win, 1, k)
+      return None
+
+   def count(self):
+      self.nodes += 1
+      if self.maxNodes and self.nodes > self.maxNodes: raise NodeLimit()
+
+   def attack(self, pos, plies):
+      # Attacker to move: win within plies (odd)?
+      result, ttMove = self.probe(pos.zkey, plies)
+      if result is not None: return result
+
+      children = []
+      for k, move in enumerate(pos.legalMoves()):
+         child = pos.domove(move)
+         self.count()
+         replies = len(child.legalMoves())
+         if replies == 0:       # defender cannot move: won
+            self.store(pos.zkey, plies, 1, k)
+            return 1
+         children.append( (k != ttMove, replies, k, child) )
+
+      if plies > 1:
+         children.sort()
+         for _, _, k, child in children:
+            win = self.defend(child, plies - 1)
+            if win:
+               self.store(pos.zkey, plies, win + 1, k)
+               return win + 1
+      self.store(pos.zkey, plies, 0)
+      return 0
+
+   def defend(self, pos, plies):
+      # Defender to move: does every move lose within plies (even)?
+      result, ttMove = self.probe(pos.zkey, plies)
+      if result is not None: return result
+
+      moves = pos.legalMoves()
+      order = range(len(moves))
+      if ttMove < len(moves):       # refutation or longest defence first
+         order.remove(ttMove)
+         order.insert(0, ttMove)
+      longest, longestMove = 0, NOMOVE
+      for k in order:
+         child = pos.domove(moves[k])
+         self.count()
+         win = self.attack(child, plies - 1)
+         if not win:
+            self.store(pos.zkey, plies, 0, k)
+            return 0
+         if win > longest: longest, longestMove = win, k
+      self.store(pos.zkey, plies, longest + 1, longestMove)
+      return longest + 1
+
+   def pv(self, pos, plies):
+      # Principal variation of a win within plies: moves of the table from pos.
+      # A position replaced in the table is searched again.
+      line = []
+      while len(line) < plies:
+         moves = pos.legalMoves()
+         if not moves: break
+         entry = self.tt.get(pos.zkey)
+         if entry is None or not entry[1]:
+            search = self.attack if len(line) % 2 == 0 else self.defend
+            search(pos, plies - len(line))
+            entry = self.tt.get(pos.zkey)
+            if entry is None or not entry[1]: break
+         if entry[3] >= len(moves): break
+         line.append(moves[entry[3]])
+         pos = pos.domove(moves[entry[3]])
+      return line
+
+   def solve(self, pos, depth, out=None):
+      # Iterative deepening up to depth moves of the attacker.
+      # Returns (plies of win or 0, principal variation). With out: a line per depth.
+      t0 = time.time()
+      for d in range(1, depth + 1):
+         plies = 2 * d - 1
+         try:
+            win = self.attack(pos, plies)
+         except NodeLimit:
+            if out: out.write("depth %2d  node limit %d reached\n" % (d, self.maxNodes))
+            return 0, []
+         elapsed = time.time() - t0
+         if out:
+            nps = self.nodes / elapsed if elapsed > 0 else 0
+            out.write("depth %2d  nodes %12d  time %8.3f  nps %9d  %s\n" %
+                      (d, self.nodes, elapsed, nps, 'WIN' if win else '-'))
+         if win: return win, self.pv(pos, win)
+      return 0, []
+
+# *** END class Solver ***
+
+
+def runSolve(arg, depth, out=sys.stdout, maxNodes=0, sizeMB=C.TT_SIZE_MB):     # PUBLIC
+   # Solve the position of a FEN string (or name of a FEN constant) and report
+   # nodes, nodes/sec and the principal variation. Returns True if a win is found.
+   name, fen = lookupFEN(arg)
+   pos = parseFEN(fen, colorAware=True)
+   solver = Solver(sizeMB, maxNodes)
+   player = ['white', 'black'][pos.color]
+
+   out.write("Solve %s (%s) for %s up to %d moves\n" % (fen, name or 'unknown', player, depth))
+   t0 = time.time()
+   win, line = solver.solve(pos, depth, out)
+   elapsed = time.time() - t0
+   nps = solver.nodes / elapsed if elapsed > 0 else 0
+   if win:
+      moving = Moving()
+      moves = (win + 1) // 2
+      out.write("%s wins in %d move%s\n" % (player, moves, "" if moves == 1 else "s"))
+      out.write("pv: %s\n" % ' '.join( moving.render_move(move) for move in line ))
+   else:
+      out.write("no forced win for %s found within %d moves\n" % (player, depth))
+   out.write("nodes %d  time %.3f  nps %d\n" % (solver.nodes, elapsed, nps))
+   out.write("table: %s\n" % solver.tt.stats())
+   out.flush()
+   return bool(win)
+# end runSolve
+
+#*******************************************************************************************
+def main():
+   parser = argparse.ArgumentParser(description='Search a forced win for the player to move')
+   parser.add_argument('fen', help='FEN string or name like FEN_DXP100_1')
+   parser.add_argument('depth', nargs='?', type=int, default=5, help='max number of moves of the player to move')
+   parser.add_argument('--nodes', type=int, default=0, metavar='N', help='stop after N nodes (0: no limit)')
+   parser.add_argument('--hash', type=float, default=C.TT_SIZE_MB, metavar='MB', help='memory of the transposition table')
+   args = parser.parse_args()
+
+   ok = runSolve(args.fen, args.depth, maxNodes=args.nodes, sizeMB=args.hash)
+   return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Timing of messages and moves; game clock
+| Remember:
+| - TimingStats keeps the last <maxSamples> durations (seconds) per name,
+|   like 'rcv.parse' or 'snd.send', and gives count, mean and percentiles.
+|   TimingStats is shared by threads (GameHandler, Display): add, summary
+|   and clear hold a lock; summary sorts a copy of the samples.
+| - Stamps: a dict {stage: time}; durations() gives the time between stages.
+| - GameClock keeps the thinking time of both colors. The time limit is
+|   gameTime minutes for numMoves moves of each color; after numMoves moves
+|   a new period with the same limit starts.
+| - dump() writes the statistics as JSON (machine-readable).
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import time, json, threading
+from collections import deque
+import dxc100_config as C
+
+def percentile(sorted_values, p):     # PUBLIC
+   # Value at percentile p (0..100) of a sorted list (nearest rank)
+   n = len(sorted_values)
+   if n == 0: return None
+   k = int(round(p / 100.0 * n + 0.5)) - 1
+   return sorted_values[min(n - 1, max(0, k))]
+# end percentile
+
+def durations(stamps, stages):     # PUBLIC
+   # Durations between consecutive stages that are stamped; name: '<from>-<to>'
+   result = []
+   prev = None
+   for stage in stages:
+      if stage not in stamps: continue
+      if prev is not None:
+         result.append(("%s-%s" % (prev, stage), stamps[stage] - stamps[prev]))
+      prev = stage
+   return result
+# end durations
+
+
+class TimingStats:
+   # Durations per name; only the last maxSamples of each name are kept
+
+   def __init__(self, maxSamples=10000):
+      self.maxSamples = maxSamples
+      self.samples = {}
+      self.counts = {}     # all samples, also the ones not kept
+      self.lock = threading.Lock()
+
+   def add(self, name, seconds):
+      with self.lock:
+         samples = self.samples.get(name)
+         if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.maxSamples)
+         samples.append(seconds)
+         self.counts[name] = self.counts.get(name, 0) + 1
+      return None
+
+   def addStamps(self, prefix, stamps, stages):
+      # Durations between the stamped stages and the total time
+      for name, seconds in durations(stamps, stages):
+         self.add(prefix + name, seconds)
+      stamped = [ stamps[s] for s in stages if s in stamps ]
+      if len(stamped) > 1: self.add(prefix + 'total', stamped[-1] - stamped[0])
+      return None
+
+   def summary(self):
+      # {name: {count, mean, p50, p99, max}} in milliseconds
+      with self.lock:
+         copies = [ (name, list(samples), self.counts[name]) for name, samples in self.samples.items() ]
+      result = {}
+      for name, values, count in copies:
+         values.sort()
+         if not values: continue
+         result[name] = {'count': count,
+                         'mean': 1000 * sum(values) / len(values),
+                         'p50': 1000 * percentile(values, 50),
+                         'p99': 1000 * percentile(values, 99),
+                         'max': 1000 * values[-1]}
+      return result
+
+   def report(self):
+      # Table of the summary as text
+      lines = [ "%-30s %8s %10s %10s %10s %10s" % ("ms", "count", "mean", "p50", "p99", "max") ]
+      for name, s in sorted(self.summary().items()):
+         lines.append("%-30s %8d %10.3f %10.3f %10.3f %10.3f" %
+                      (name, s['count'], s['mean'], s['p50'], s['p99'], s['max']))
+      return '\n'.join(lines)
+
+   def dump(self, out, extra=None):
+      # Summary as JSON; extra: dict with more items (like the game clock)
+      data = {'time': time.time(), 'unit': 'ms', 'timings': self.summary()}
+      if extra: data.update(extra)
+      json.dump(data, out, indent=1, sort_keys=True)
+      out.write('\n')
+      return None
+
+   def clear(self):
+      with self.lock:
+         self.samples = {}
+         self.counts = {}
+
+# *** END class TimingStats ***
+
+
+class GameClock:
+   # Thinking time of both colors during a game.
+   # start() when the game starts; switch() after every move.
+   #
+
+   def __init__(self, gameTime, numMoves, colorToMove=C.WHITE):
+      self.limit = 60.0 * float(gameTime)     # seconds per period
+      self.numMoves = max(1, int(numMoves))   # moves per period
+      self.used = [0.0, 0.0]       # seconds used per color
+      self.moves = [0, 0]          # moves done per color
+      self.color = colorToMove     # color whose clock is running
+      self.started = None          # time the running clock started
+
+   def start(self, t=None):
+      self.started = time.time() if t is None else t
+
+   def stop(self):
+      # Game ended: no clock running
+      self.started = None
+
+   def running(self, t=None):
+      # Seconds used for the move of the color to move so far
+      if self.started is None: return 0.0
+      return (time.time() if t is None else t) - self.started
+
+   def switch(self, t=None):
+      # Move done by the color to move; returns the seconds used for this move
+      t = time.time() if t is None else t
+      spent = self.running(t)
+      self.used[self.color] += spent
+      self.moves[self.color] += 1
+      self.color = 1 - self.color
+      self.started = t
+      return spent
+
+   def remaining(self, color, t=None):
+      # Seconds left for color until the next time control
+      periods = self.moves[color] // self.numMoves + 1
+      used = self.used[color] + (self.running(t) if color == self.color else 0.0)
+      return periods * self.limit - used
+
+   def movesToControl(self, color):
+      return self.numMoves - self.moves[color] % self.numMoves
+
+   def state(self):
+      # Dict for the JSON dump
+      return {'limit': self.limit, 'numMoves': self.numMoves, 'used': list(self.used),
+              'moves': list(self.moves), 'remaining': [self.remaining(C.WHITE), self.remaining(C.BLACK)],
+              'toMove': self.color}
+
+   def status(self):
+      lines = []
+      for color, name in ((C.WHITE, 'white'), (C.BLACK, 'black')):
+         rem = self.remaining(color)
+         lines.append("%-6s used %7.1f s  remaining %s%d:%02d  moves %d (%d to time control)%s" %
+                      (name, self.used[color], '-' if rem < 0 else '', abs(rem) // 60, abs(rem) % 60,
+                       self.moves[color], self.movesToControl(color), '  *' if color == self.color else ''))
+      return '\n'.join(lines)
+
+# *** END class GameClock ***
+
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Transposition table with a fixed memory budget
+| Remember:
+| - Key is the 64-bit Zobrist key of a position. The low bits give the
+|   bucket; the high 32 bits are stored as check to detect other positions
+|   in the same bucket (collisions).
+| - Each entry: check, value (integer, like a node count or the plies of a
+|   win), depth (0..255), flag (1..255; 0 is an empty entry) and move
+|   (index in the list of legal moves, 0..65534; NOMOVE if none).
+| - Entries are stored in parallel arrays, preallocated for the budget
+|   (C.TT_SIZE_MB). The number of buckets is a power of 2.
+| - A bucket has two entries:
+|   slot 0 depth-preferred: replaced by the same position or a deeper search
+|   slot 1 always-replace:  gets the entries not accepted by slot 0
+| - Not locked: use one table per search thread.
+| Usage:
+|    tt = TranspositionTable(16)
+|    tt.put(pos.zkey, depth, value, flag, move)
+|    entry = tt.get(pos.zkey)     # (depth, value, flag, move) or None
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+from array import array
+import dxc100_config as C
+
+NOMOVE = 0xFFFF  # no move in entry
+EMPTY = 0        # flag of an empty entry
+
+# Value: 8 bytes; 'l' is 4 bytes on some platforms (Windows), then a double (exact up to 2**53)
+VALUE_TYPE = 'l' if array('l').itemsize == 8 else 'd'
+ENTRY_SIZE = array('I').itemsize + array(VALUE_TYPE).itemsize + 2 + array('H').itemsize    # bytes per entry
+
+class TranspositionTable:
+   # Fixed-size table of search results; see module doc
+
+   def __init__(self, sizeMB=C.TT_SIZE_MB):
+      self.resize(sizeMB)
+
+   def resize(self, sizeMB):
+      # Allocate the arrays for at most sizeMB megabytes; the table is empty afterwards
+      entries = max(2, int(sizeMB * 1024 * 1024) // ENTRY_SIZE)
+      buckets = 1
+      while 2 * buckets * 2 <= entries: buckets *= 2
+      self.sizeMB = sizeMB
+      self.mask = buckets - 1
+      n = 2 * buckets
+      self.checks = array('I', [0]) * n
+      self.values = array(VALUE_TYPE, [0]) * n
+      self.depths = array('B', [0]) * n
+      self.flags = array('B', [EMPTY]) * n
+      self.moves = array('H', [NOMOVE]) * n
+      self.resetStats()
+      return None
+
+   def resetStats(self):
+      self.probes = 0
+      self.hits = 0
+      self.collisions = 0     # probes of a bucket with only other positions
+      self.stores = 0
+      self.replaced = 0       # stores that overwrote another position
+      self.used = 0           # entries not empty
+
+   def slot(self, zkey):
+      # Index of the entry of zkey, or -1 if not in the table
+      i = (zkey & self.mask) << 1
+      check = (zkey >> 32) & 0xFFFFFFFF
+      flags, checks = self.flags, self.checks
+      if flags[i] != EMPTY and checks[i] == check: return i
+      if flags[i+1] != EMPTY and checks[i+1] == check: return i + 1
+      return -1
+
+   def get(self, zkey):
+      # Entry of zkey as (depth, value, flag, move), or None
+      self.probes += 1
+      i = self.slot(zkey)
+      if i < 0:
+         k = (zkey & self.mask) << 1
+         if self.flags[k] != EMPTY or self.flags[k+1] != EMPTY: self.collisions += 1
+         return None
+      self.hits += 1
+      return (self.depths[i], self.values[i], self.flags[i], self.moves[i])
+
+   def put(self, zkey, depth, value, flag=1, move=NOMOVE):
+      # Store an entry; depth is clipped to 0..255, flag must not be EMPTY.
+      # A move index out of 0..NOMOVE is stored as NOMOVE.
+      i = (zkey & self.mask) << 1
+      check = (zkey >> 32) & 0xFFFFFFFF
+      depth = min(max(depth, 0), 255)
+      flags, checks = self.flags, self.checks
+      if flags[i] != EMPTY and checks[i] != check and depth < self.depths[i]:
+         i += 1      # slot 0 keeps the deeper search of another position
+      if flags[i] == EMPTY:
+         self.used += 1
+      elif checks[i] != check:
+         self.replaced += 1
+      if i & 1 == 0 and flags[i+1] != EMPTY and checks[i+1] == check:
+         flags[i+1] = EMPTY     # old entry of this position in slot 1
+         self.used -= 1
+      checks[i] = check
+      self.values[i] = value
+      self.depths[i] = depth
+      flags[i] = flag
+      self.moves[i] = move if 0 <= move < NOMOVE else NOMOVE
+      self.stores += 1
+      return None
+
+   def clear(self):
+      self.resize(self.sizeMB)
+
+   def capacity(self):
+      return len(self.flags)
+
+   def sizeof(self):
+      # Memory of the arrays in bytes
+      return sum( len(a) * a.itemsize for a in (self.checks, self.values, self.depths, self.flags, self.moves) )
+
+   def stats(self):
+      # Summary of counters as a string
+      ratio = 100.0 * self.hits / self.probes if self.probes > 0 else 0.0
+      return "entries %d/%d (%.1f MB)  probes %d  hits %d (%.1f%%)  collisions %d  stores %d  replaced %d" % \
+             (self.used, self.capacity(), self.sizeof() / 1048576.0, self.probes, self.hits, ratio,
+              self.collisions, self.stores, self.replaced)
+
+# *** END class TranspositionTable ***
+
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+|============================================================================
+| DXC100: Zobrist hashing of positions
+| Remember:
+| - A position key is the XOR of a 64-bit random number for each piece on its square.
+| - Keys of black pieces are the keys of the white pieces on the rotated square
+|   with swapped 32-bit halves. Therefore the key of the rotated position
+|   (swapcase and reversed board) is the key with swapped halves: rotateKey().
+| - Colour-aware positions with black to move have SIDEKEY added. Its halves are
+|   equal, so rotateKey() also works for these keys.
+| - The random numbers are seeded (C.ZOBRIST_SEED), so keys are the same in every
+|   process and can be stored in files.
+|
+| (c) Arthur Kalverboer 2018
+============================================================================
+"""
+
+import random
+import dxc100_config as C
+
+MASK32 = 0xFFFFFFFF
+
+def rotateKey(zkey):     # PUBLIC
+   # Key of the rotated position: swap the 32-bit halves
+   return ((zkey & MASK32) << 32) | (zkey >> 32)
+
+def _initKeys(seed):
+   # Table piece -> list of 52 keys (index is square). Empty squares have key 0.
+   rng = random.Random(seed)
+   keys = {'.': [0] * 52, '0': [0] * 52}
+   for p in ('P', 'K'):
+      keys[p] = [0] * 52
+      keys[p.lower()] = [0] * 52
+   for p in ('P', 'K'):
+      for i in range(1, 51):
+         keys[p][i] = rng.getrandbits(64)
+         keys[p.lower()][51-i] = rotateKey(keys[p][i])
+   return keys
+
+def _initSideKey(seed):
+   # Key of black to move; own random stream, so the piece keys do not change
+   half = random.Random(seed + 1).getrandbits(32)
+   return (half << 32) | half
+
+ZOBRIST = _initKeys(C.ZOBRIST_SEED)
+SIDEKEY = _initSideKey(C.ZOBRIST_SEED)
+
+def hashSetup(setup, color=C.WHITE):     # PUBLIC
+   # Zobrist key of a setup (list or string of 52 char) with color to move.
+   # For a "one-color" setup white is always to move.
+   zkey = 0 if color == C.WHITE else SIDEKEY
+   for i in range(1, 51):
+      p = setup[i]
+      if p != '.': zkey ^= ZOBRIST[p][i]
+   return zkey
+# end hashSetup
+
+#*******************************************************************************************
+def main():
+   print('nothing to do')
+   return 0
+
+if __name__ == '__main__':
+    main()